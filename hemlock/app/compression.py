@@ -0,0 +1,48 @@
+"""Html response minification and compression
+
+Html responses of hemlock routes at least compress_threshold bytes long are
+minified (if the minify_html setting is True, see html_minifier) and
+compressed with gzip or deflate, whichever the client prefers according to
+its Accept-Encoding header. Smaller responses, streamed responses, and
+responses which are already encoded (e.g. fingerprinted static assets) are
+returned unchanged. If compress_threshold is None, no response is minified
+or compressed.
+"""
+
+from hemlock.app.html_minifier import minify_html
+
+from flask import current_app, request
+import gzip
+import zlib
+
+# Level of gzip and deflate compression (1-9)
+COMPRESSION_LEVEL = 6
+ENCODINGS = ['gzip', 'deflate']
+
+
+def compress_response(response):
+    """Minify and compress an html response"""
+    threshold = current_app.compress_threshold
+    if (
+            threshold is None or response.mimetype != 'text/html'
+            or response.is_streamed or response.direct_passthrough
+            or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+        ):
+        return response
+    data = response.get_data()
+    if len(data) < threshold:
+        return response
+    if current_app.minify_html:
+        html = minify_html(data.decode(response.charset))
+        data = html.encode(response.charset)
+    encoding = request.accept_encodings.best_match(ENCODINGS)
+    if encoding == 'gzip':
+        data = gzip.compress(data, COMPRESSION_LEVEL)
+    elif encoding == 'deflate':
+        data = zlib.compress(data, COMPRESSION_LEVEL)
+    if encoding is not None:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.set_data(data)
+    return response
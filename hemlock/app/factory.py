@@ -1,6 +1,7 @@
 """Application factory"""
 
 from hemlock.app.settings import get_settings, get_screenouts, Config
+from hemlock.app.static_assets import get_static_assets
 # from hemlock.extensions import Viewer
 
 from datetime import datetime, timedelta
@@ -34,6 +35,7 @@ def create_app(settings):
     app.config.from_object(Config)
     
     get_screenouts(app)
+    get_static_assets(app)
     
     bootstrap.init_app(app)
     app.register_blueprint(bp)
@@ -0,0 +1,56 @@
+"""Html minifier
+
+Collapses each run of whitespace in text and between tags to a single space.
+Inside tags, whitespace between attributes is collapsed, but quoted
+attribute values (e.g. the value of a text input holding a participant's
+response) are copied verbatim. Comments, and the content of pre, textarea,
+script, and style elements, are also copied verbatim. The html is scanned
+once with regular expressions and is not parsed, so minification costs a
+small fraction of rendering.
+"""
+
+import re
+
+# Elements whose content must be copied verbatim
+VERBATIM_TAGS = ['pre', 'textarea', 'script', 'style']
+
+# Rest of a tag after its name, whose quoted attribute values may contain >
+TAG_REST = r'[^>"\']*(?:(?:"[^"]*"|\'[^\']*\')[^>"\']*)*>'
+# Verbatim elements and comments (group 1), or other tags (group 3)
+TOKEN_RE = re.compile(
+    r'(<({tags})\b{rest}.*?</\2\s*>|<!--.*?-->)|(<{rest})'.format(
+        tags='|'.join(VERBATIM_TAGS), rest=TAG_REST),
+    re.IGNORECASE | re.DOTALL
+    )
+# Quoted attribute values (group 1) or whitespace within a tag
+TAG_PART_RE = re.compile(r'("[^"]*"|\'[^\']*\')|\s+')
+# Whitespace which minification would change
+EXCESS_WHITESPACE_RE = re.compile(r'\s\s|[^\S ]')
+WHITESPACE_RE = re.compile(r'\s+')
+
+
+def minify_html(html):
+    """Return minified html"""
+    return ''.join(iter_minified(html)).strip()
+
+def iter_minified(html):
+    """Yield minified chunks of html"""
+    start = 0
+    for match in TOKEN_RE.finditer(html):
+        yield WHITESPACE_RE.sub(' ', html[start:match.start()])
+        if match.group(1) is not None:
+            yield match.group(1)
+        else:
+            yield minify_tag(match.group(3))
+        start = match.end()
+    yield WHITESPACE_RE.sub(' ', html[start:])
+
+def minify_tag(tag):
+    """Collapse whitespace in a tag outside quoted attribute values"""
+    if EXCESS_WHITESPACE_RE.search(tag) is None:
+        return tag
+    return TAG_PART_RE.sub(minify_tag_part, tag)
+
+def minify_tag_part(match):
+    """Keep a quoted attribute value, or collapse whitespace"""
+    return match.group(1) or ' '
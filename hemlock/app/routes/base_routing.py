@@ -1,22 +1,28 @@
 """Base routing functions"""
 
+from hemlock.app.compression import compress_response
 from hemlock.app.factory import bp, db, login_manager
 from hemlock.database.models import Participant, Navbar, Brand, Navitem, Dropdownitem
-from hemlock.database.private import DataStore
+from hemlock.database.private import DataStore, StatusCounter, StoreSequence, StoreUpdate
+from hemlock.database.private.data_store import STATUS
 
-from flask import current_app, url_for
+from flask import abort, current_app, request, url_for
 
 @login_manager.user_loader
 def load_user(id):
-    return Participant.query.get(int(id))
+    return Participant.load(int(id))
     
 @bp.before_app_first_request
 def init_app():
     """Create database tables and initialize data storage models
     
-    Additionally, set a scheduler job to log the status periodically.
+    Additionally, set scheduler jobs to log the status and reconcile the 
+    status counters periodically, and in write-behind mode, a job to flush 
+    queued DataStore updates.
     """
     db.create_all()
+    StatusCounter.init_shards(STATUS, current_app.status_counter_shards)
+    StoreSequence.init_counter()
     if not DataStore.query.first():
         DataStore()
     if not Navbar.query.filter_by(name='researcher_navbar').first():
@@ -27,6 +33,30 @@ def init_app():
         seconds=current_app.status_log_period.seconds,
         args=[current_app._get_current_object()], id='log_status'
         )
+    current_app.apscheduler.add_job(
+        func=reconcile_status, trigger='interval',
+        seconds=current_app.status_reconcile_period.seconds,
+        args=[current_app._get_current_object()], id='reconcile_status'
+        )
+    if current_app.write_behind_interval is not None:
+        current_app.apscheduler.add_job(
+            func=flush_store_updates, trigger='interval',
+            seconds=current_app.write_behind_interval/1000,
+            args=[current_app._get_current_object()], id='write_behind'
+            )
+
+@bp.after_request
+def compress(response):
+    """Minify and compress html responses (see compression)"""
+    return compress_response(response)
+
+@bp.route('/assets/<path:filename>')
+def static_asset(filename):
+    """Serve a fingerprinted static asset (see static_assets)"""
+    asset = current_app.static_assets.assets.get(filename)
+    if asset is None:
+        abort(404)
+    return asset.make_response(request)
 
 def create_researcher_navbar():
     navbar = Navbar(name='researcher_navbar')
@@ -41,4 +71,21 @@ def log_current_status(app):
     with app.app_context():
         ds = DataStore.query.first()
         ds.log_status()
-        db.session.commit()
\ No newline at end of file
+        db.session.commit()
+        
+def reconcile_status(app):
+    """Correct status counter drift from Participant rows
+    
+    Status changes still queued for write-behind are not yet reflected in 
+    the counters, and are subtracted from the Participant counts.
+    """
+    with app.app_context():
+        actual = Participant.status_counts()
+        pending = StoreUpdate.pending_counts()
+        StatusCounter.reconcile(
+            {s: actual[s] - pending.get(s, 0) for s in actual})
+        db.session.commit()
+        
+def flush_store_updates(app):
+    with app.app_context():
+        DataStore.flush_updates()
@@ -3,7 +3,7 @@
 from hemlock.app.factory import bp, db
 from hemlock.database.models import Participant, Page
 from hemlock.question_polymorphs import Text
-from hemlock.database.private import DataStore, PageHtml
+from hemlock.database.private import DataStore, PageHtml, StoreUpdate
 
 from datetime import datetime, timedelta
 from flask import current_app, flash, jsonify, Markup, redirect, render_template, request, url_for
@@ -72,10 +72,19 @@ def is_screenout(meta):
     return match_found(visitor=meta, tracked=tracked_meta, keys=keys)
 
 def is_duplicate(meta):
-    """Look for a match between visitor metadata and previous participants"""
+    """Look for a match between visitor metadata and previous participants
+    
+    In write-behind mode, the metadata of queued DataStore updates are 
+    checked as well.
+    """
     tracked_meta = DataStore.query.first().meta
     keys = current_app.duplicate_keys
-    return match_found(visitor=meta, tracked=tracked_meta, keys=keys)
+    if match_found(visitor=meta, tracked=tracked_meta, keys=keys):
+        return True
+    if current_app.write_behind_interval is None:
+        return False
+    pending_meta = StoreUpdate.pending_meta()
+    return match_found(visitor=meta, tracked=pending_meta, keys=keys)
 
 def match_found(visitor, tracked, keys):
     """Indicate that this visitor should be screened out
@@ -140,7 +149,11 @@ def survey():
         part.update_end_time()
         part.completed = True
       
+    part_id = part.id
     db.session.commit()
+    # Reload the survey graph expired on commit
+    part = Participant.load(part_id, refresh=True)
+    page = part.current_page
     # Do not recompile if time has expired
     return page.compile_html(recompile = not part.time_expired)
     
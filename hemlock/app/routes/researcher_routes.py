@@ -3,12 +3,15 @@
 from hemlock.app.factory import bp, db
 from hemlock.app.routes.researcher_texts import *
 from hemlock.database.models import Navbar, Page, Choice, Validator
-from hemlock.question_polymorphs import Free, MultiChoice, Text
-from hemlock.database.private import DataStore
+from hemlock.question_polymorphs import Free, MultiChoice, SingleChoice, Text
+from hemlock.database.private import DataStore, StatusLog
+from hemlock.database.private.data_store import TABLES
 
-from flask import current_app, flash, Markup, redirect, request, session, url_for
+from datetime import datetime, timedelta
+from flask import Response, abort, current_app, flash, jsonify, Markup, redirect, request, session, stream_with_context, url_for
 from functools import wraps
 from werkzeug.security import check_password_hash
+import zlib
 
 
 @bp.route('/login', methods=['GET','POST'])
@@ -18,7 +21,9 @@ def login():
         session['logged_in'] = login_page._submit() == 'forward'
         if session['logged_in']:
             requested = request.args.get('requested') or 'participants'
-            return redirect(url_for('hemlock.{}'.format(requested)))
+            requested_args = session.pop('requested_args', {})
+            return redirect(
+                url_for('hemlock.{}'.format(requested), **requested_args))
     else:
         login_page = Page(back=False, forward_button=LOGIN_BUTTON)
         q = Free(login_page, text=PASSWORD_PROMPT)
@@ -34,12 +39,13 @@ def check_password(question):
 
 def researcher_login_required(func):
     @wraps(func)
-    def login_requirement():
+    def login_requirement(*args, **kwargs):
         if 'logged_in' not in session or not session['logged_in']:
             session.pop('_flashes', None)
             flash(LOGIN_REQUIRED)
+            session['requested_args'] = kwargs
             return redirect(url_for('hemlock.login', requested=func.__name__))
-        return func()
+        return func(*args, **kwargs)
     return login_requirement
     
 def researcher_navbar():
@@ -52,20 +58,138 @@ def participants():
     p.js.append(current_app.socket_js)
     p.js.append('js/participants.min.js')
     q = Text(p)
-    q.text = PARTICIPANTS.format(**DataStore.query.first().current_status)
+    q.text = PARTICIPANTS.format(**DataStore.status_counts())
     return p.compile_html()
     
+@bp.route('/participants-status')
+@researcher_login_required
+def participants_status():
+    """Current status as JSON, for dashboards which (re)connect"""
+    return jsonify(DataStore.status_counts())
+    
 @bp.route('/download', methods=['GET','POST'])
 @researcher_login_required
 def download():
-    p = Page(nav=researcher_navbar(), back=False)
-    p.forward_button=DOWNLOAD_BUTTON
-    q = MultiChoice(p, text=DOWNLOAD)
-    Choice(q, text="Metadata")
-    Choice(q, text="Status Log")
-    Choice(q, text="Dataframe")
+    if request.method == 'POST':
+        download_page = Page.query.get(session['download_page_id'])
+        if download_page._submit() == 'forward':
+            return download_links(download_page)
+    else:
+        download_page = Page(nav=researcher_navbar(), back=False)
+        download_page.forward_button = DOWNLOAD_BUTTON
+        q = MultiChoice(download_page, text=DOWNLOAD)
+        Choice(q, text="Metadata", value='meta')
+        Choice(q, text="Status Log", value='status_log')
+        Choice(q, text="Dataframe", value='data')
+        q = SingleChoice(download_page, text=COMPRESSION)
+        Choice(q, text="None", value='')
+        Choice(q, text="gzip", value='gzip')
+        q = SingleChoice(download_page, text=STATUS_LOG_RESOLUTION)
+        Choice(q, text="All entries", value='')
+        Choice(q, text="Hourly", value='3600')
+        Choice(q, text="Daily", value='86400')
+        q = Free(download_page, text=WATERMARK_PROMPT)
+        Validator(q, validate=check_watermark)
+        session['download_page_id'] = download_page.id
+    db.session.commit()
+    return download_page.compile_html()
+
+def check_watermark(question):
+    if question.response and not question.response.isdigit():
+        return WATERMARK_INVALID
+
+def download_links(download_page):
+    """Page with links to stream the selected tables
+    
+    Download progress is received over the participants namespace.
+    """
+    tables_q, compression_q, bucket_q, watermark_q = download_page.questions
+    compression = compression_q.data or None
+    bucket = bucket_q.data or None
+    since = watermark_q.data or None
+    p = Page(nav=researcher_navbar(), back=False, forward=False)
+    p.js.append(current_app.socket_js)
+    p.js.append('js/participants.min.js')
+    links = [
+        DOWNLOAD_LINK.format(
+            url=url_for(
+                'hemlock.download_table', table=choice.value, 
+                compression=compression, 
+                since=since if choice.value == 'data' else None,
+                bucket=bucket if choice.value == 'status_log' else None
+                ),
+            table=choice.value, text=choice.text
+            )
+        for choice in tables_q.selected_choices
+        ]
+    Text(p, text=DOWNLOAD_LINKS.format(links=''.join(links)))
+    Text(p, text=WATERMARK.format(DataStore.query.first().store_seq))
+    db.session.commit()
     return p.compile_html()
 
+@bp.route('/download/<table>')
+@researcher_login_required
+def download_table(table):
+    """Stream a table as CSV, optionally compressed with gzip
+    
+    The response is generated in chunks of rows (see DataStore.iter_csv). 
+    Queued DataStore updates are applied first. Only stored data are 
+    exported, i.e. those of Participants who have completed or timed out; 
+    in-progress Participants are not stored on download.
+    
+    If a watermark is given (since), the data are restricted to Participants 
+    stored after the watermark. The watermark for the next download is 
+    returned in the Hemlock-Watermark header.
+    
+    The status log may be restricted by time range (start and end) and 
+    downsampled (see status_log_args).
+    """
+    if table not in TABLES:
+        abort(404)
+    if current_app.write_behind_interval is not None:
+        DataStore.flush_updates()
+    ds = DataStore.query.first()
+    since = request.args.get('since', type=int)
+    chunks = ds.iter_csv(table, since=since, **status_log_args())
+    filename = table if since is None else '{}_since_{}'.format(table, since)
+    filename, mimetype = filename+'.csv', 'text/csv'
+    if request.args.get('compression') == 'gzip':
+        chunks = gzip_chunks(chunks)
+        filename, mimetype = filename+'.gz', 'application/gzip'
+    resp = Response(stream_with_context(chunks), mimetype=mimetype)
+    disposition = 'attachment; filename={}'.format(filename)
+    resp.headers['Content-Disposition'] = disposition
+    resp.headers['Hemlock-Watermark'] = str(ds.store_seq)
+    return resp
+
+@bp.route('/status-log')
+@researcher_login_required
+def status_log():
+    """Status log entries as JSON (see status_log_args)"""
+    return jsonify(entries=StatusLog.to_dicts(**status_log_args()))
+
+def status_log_args():
+    """Get status log query arguments from the request
+    
+    start and end are times in ISO format. bucket is the downsampling 
+    period in seconds.
+    """
+    bucket = request.args.get('bucket', type=int)
+    return dict(
+        start=request.args.get('start', type=datetime.fromisoformat),
+        end=request.args.get('end', type=datetime.fromisoformat),
+        bucket=None if bucket is None else timedelta(seconds=bucket)
+        )
+
+def gzip_chunks(chunks):
+    """Compress a stream of text chunks in gzip format"""
+    compressor = zlib.compressobj(wbits=16+zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk.encode())
+        if compressed:
+            yield compressed
+    yield compressor.flush()
+
 @bp.route('/logout')
 def logout():
     session['logged_in'] = False
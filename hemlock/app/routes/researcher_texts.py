@@ -40,5 +40,35 @@ PARTICIPANTS = """
 
 DOWNLOAD = "<p>Select files to download.</p>"
 
+COMPRESSION = "<p>Select compression.</p>"
+
+STATUS_LOG_RESOLUTION = "<p>Select status log resolution.</p>"
+
+WATERMARK_PROMPT = """
+<p>To download only Participants stored since a previous download, enter its 
+watermark. Leave blank to download all Participants.</p>
+"""
+
+WATERMARK_INVALID = "<p>The watermark must be a whole number.</p>"
+
+WATERMARK = """
+<p>Current watermark: {}. Merge a partial download into the previous one 
+with <code>DataStore.merge_delta</code>.</p>
+"""
+
+DOWNLOAD_LINKS = """
+<p>Click to download. Progress is shown next to each file.</p>
+<ul>
+{links}
+</ul>
+"""
+
+DOWNLOAD_LINK = """
+<li>
+    <a href="{url}">{text}</a>
+    <span id="{table}-progress"></span>
+</li>
+"""
+
 DOWNLOAD_BUTTON = Markup(
     FORWARD_BUTTON_GENERIC.format(classes='w-100', text='Download'))
\ No newline at end of file
@@ -1,6 +1,16 @@
 """Application default settings and configuration object
 
-time_limit and status_logger_period must be in 'hh:mm:ss' format.
+time_limit, status_log_period, and status_reconcile_period must be in 
+'hh:mm:ss' format.
+status_broadcast_interval and write_behind_interval are in milliseconds. If 
+status_broadcast_interval is None, every status change is broadcast 
+immediately. If write_behind_interval is None, the DataStore is updated 
+synchronously.
+compress_threshold is in bytes. Html responses at least this long are 
+minified (if minify_html is True) and compressed (see compression). If 
+compress_threshold is None, responses are neither minified nor compressed.
+preload_endpoints lists the endpoints for which the current Participant's 
+survey graph is preloaded (see Participant.load).
 """
 
 from hemlock.app.setting_utils import *
@@ -14,16 +24,21 @@ import pandas as pd
 default_settings = {
     'back': False,
     'back_button': BACK_BUTTON,
+    'compress_threshold': 1024,
     'duplicate_keys': ['IPv4', 'workerId'],
     'css': ['css/bootstrap.min.css', 'css/default.min.css'],
+    'data_storage': 'participant',
+    'download_chunk_size': 1000,
     'forward': True,
     'forward_button': FORWARD_BUTTON,
     'js': 'js/default.min.js',
+    'minify_html': True,
     'nav': None,
     'page_compile': page_compile,
     'page_debug': None,
     'page_post': page_post,
     'password': '',
+    'preload_endpoints': ['hemlock.survey'],
     'question_compile': None,
     'question_debug': None,
     'question_div_classes': ['form-group', 'question'],
@@ -36,12 +51,17 @@ default_settings = {
     'screenout_text': SCREENOUT,
     'socket_js': '//cdnjs.cloudflare.com/ajax/libs/socket.io/2.2.0/socket.io.js',
     'static_folder': 'static',
+    'status_broadcast_interval': 1000,
+    'status_counter_shards': 4,
     'status_log_period': '00:02:00',
+    'status_reconcile_period': '00:05:00',
     'survey_template': 'default_survey.html',
     'template_folder': 'templates',
     'time_expired_text': TIME_EXPIRED,
     'time_limit': None,
-    'view_template': 'default_view.html'
+    'view_template': 'default_view.html',
+    'write_behind_batch': 100,
+    'write_behind_interval': None,
     }
     
 def get_settings(settings):
@@ -64,6 +84,7 @@ def get_settings(settings):
     to_list(settings, 'screenout_keys')
     to_timedelta(settings, 'time_limit')
     to_timedelta(settings, 'status_log_period')
+    to_timedelta(settings, 'status_reconcile_period')
     settings['password_hash'] = generate_password_hash(
         settings.pop('password'))
     cwd = os.getcwd()
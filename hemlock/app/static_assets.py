@@ -0,0 +1,94 @@
+"""Fingerprinted static assets
+
+When the application is created, the local css and js files named in the
+css and js settings are read from the static folder, fingerprinted with a
+hash of their content, and compressed with gzip (and with brotli, if the
+brotli package is installed). They are served from memory at
+/assets/<path>.<fingerprint>.<ext> with immutable cache headers, since a
+changed file gets a new url.
+
+asset_url (also available as a template global) returns the fingerprinted
+url of a file in the pipeline, and the plain static url of any other file.
+Absolute paths and protocol-relative urls are returned unchanged.
+"""
+
+from flask import Response, current_app, url_for
+from hashlib import sha256
+import gzip
+import mimetypes
+import os
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Number of hexadecimal digits of a fingerprint
+FINGERPRINT_LENGTH = 16
+# Cache lifetime of fingerprinted assets in seconds (one year)
+MAX_AGE = 31536000
+
+
+class Asset():
+    """Static file content, fingerprint, and compressed encodings"""
+    def __init__(self, filename, data):
+        self.fingerprint = sha256(data).hexdigest()[:FINGERPRINT_LENGTH]
+        root, ext = os.path.splitext(filename)
+        self.name = '{}.{}{}'.format(root, self.fingerprint, ext)
+        self.mimetype = (
+            mimetypes.guess_type(filename)[0] or 'application/octet-stream')
+        self.encodings = {'gzip': gzip.compress(data, 9, mtime=0)}
+        if brotli is not None:
+            self.encodings['br'] = brotli.compress(data, quality=11)
+        self.data = data
+
+    def make_response(self, request):
+        """Make a response with the smallest encoding the client accepts"""
+        encoding, data = None, self.data
+        for key, value in self.encodings.items():
+            accepted = request.accept_encodings[key] > 0
+            if accepted and len(value) < len(data):
+                encoding, data = key, value
+        response = Response(data, mimetype=self.mimetype)
+        if encoding is not None:
+            response.headers['Content-Encoding'] = encoding
+        response.headers['Vary'] = 'Accept-Encoding'
+        response.cache_control.public = True
+        response.cache_control.max_age = MAX_AGE
+        response.cache_control.immutable = True
+        response.set_etag(self.fingerprint)
+        return response.make_conditional(request)
+
+
+class StaticAssets():
+    """Fingerprinted assets by static filename and by fingerprinted name"""
+    def __init__(self, static_folder, filenames):
+        self.names = {}
+        self.assets = {}
+        for filename in filenames:
+            path = os.path.join(static_folder, filename)
+            if filename.startswith('/') or not os.path.isfile(path):
+                continue
+            with open(path, 'rb') as f:
+                asset = Asset(filename, f.read())
+            self.names[filename] = asset.name
+            self.assets[asset.name] = asset
+        self.digest = sha256(
+            ' '.join(sorted(self.assets)).encode()
+            ).hexdigest()[:FINGERPRINT_LENGTH]
+
+
+def get_static_assets(app):
+    """Store the asset pipeline as an application attribute"""
+    app.static_assets = StaticAssets(app.static_folder, app.css+app.js)
+    app.add_template_global(asset_url)
+
+def asset_url(filename):
+    """Get the url of a static file, fingerprinted if the file is in the
+    asset pipeline"""
+    if filename.startswith('/'):
+        return filename
+    name = current_app.static_assets.names.get(filename)
+    if name is None:
+        return url_for('static', filename=filename)
+    return url_for('hemlock.static_asset', filename=name)
@@ -0,0 +1,57 @@
+"""Coalescing status broadcaster
+
+Rather than emitting a status snapshot on every status change, changes are
+marked as pending. A background task emits at most one snapshot per
+status_broadcast_interval (milliseconds). The snapshot is taken when it is
+emitted, so the latest state wins. If status_broadcast_interval is None,
+snapshots are emitted immediately.
+"""
+
+from hemlock.app.factory import socketio
+
+from flask import current_app
+from threading import Lock
+
+
+class StatusBroadcaster():
+    def __init__(self, snapshot, event='json', namespace='/participants-nsp'):
+        """
+        snapshot is a function which returns the message to emit. It is
+        called in an application context.
+        """
+        self.snapshot = snapshot
+        self.event = event
+        self.namespace = namespace
+        self._pending = False
+        self._task = None
+        self._lock = Lock()
+
+    def notify(self):
+        """Mark a status change, starting the background task if needed"""
+        interval = current_app.status_broadcast_interval
+        if interval is None:
+            return self.emit()
+        self._pending = True
+        if self._task is None:
+            with self._lock:
+                if self._task is None:
+                    self._task = socketio.start_background_task(
+                        self._run, current_app._get_current_object(),
+                        interval/1000
+                        )
+
+    def emit(self):
+        socketio.emit(self.event, self.snapshot(), namespace=self.namespace)
+
+    def _run(self, app, interval):
+        """Emit a snapshot after each interval with a pending change"""
+        while True:
+            socketio.sleep(interval)
+            if not self._pending:
+                continue
+            self._pending = False
+            with app.app_context():
+                try:
+                    self.emit()
+                except Exception:
+                    app.logger.exception('Status broadcast failed')
@@ -1,4 +1,5 @@
 """Hemlock database models and objects"""
 
 from hemlock.database.models import *
+from hemlock.database.private import deferred_flush, static_branch
 from hemlock.database.types import Function
\ No newline at end of file
@@ -19,6 +19,7 @@ from hemlock.database.private.base import BranchingBase
 from hemlock.database.types import Function, FunctionType
 
 from flask_login import current_user
+from sqlalchemy import event
 from sqlalchemy.ext.orderinglist import ordering_list
 
 
@@ -81,9 +82,18 @@ class Branch(BranchingBase, db.Model):
         
     @property
     def questions(self):
-        page_questions = [
-            q for p in self.pages for q in p.questions+[p.timer]]
-        return page_questions + self.embedded
+        """Questions of the Branch's Pages (and their timers), followed by
+        its embedded Questions
+        
+        The list is cached until the Branch's Pages, their Questions or 
+        timers, or its embedded Questions change, or until the Branch is 
+        refreshed from the database. It must not be modified.
+        """
+        if getattr(self, '_questions_cache', None) is None:
+            page_questions = [
+                q for p in self.pages for q in p.questions+[p.timer]]
+            self._questions_cache = page_questions + self.embedded
+        return self._questions_cache
         
     navigate = db.Column(FunctionType)
     _isroot = db.Column(db.Boolean)
@@ -95,6 +105,12 @@ class Branch(BranchingBase, db.Model):
         self._isroot = False
         super().__init__()
         
+    def _invalidate_views(self):
+        """Invalidate the cached questions, and the Participant's views"""
+        self._questions_cache = None
+        if self.part is not None:
+            self.part._invalidate_views()
+        
     def _forward(self):
         """Advance forward to the next page in the queue"""
         if self.current_page is None:
@@ -126,5 +142,26 @@ class Branch(BranchingBase, db.Model):
         [p.view_nav(indent) for p in self.pages]
         head_branch = HEAD_BRANCH if None == self.current_page else ''
         print(indent, None, head_branch)
-        if self.next_branch in self.part.branch_stack:
-            self.next_branch.view_nav()
\ No newline at end of file
+        if self.part._next_branch_in_stack(self):
+            self.next_branch.view_nav()
+
+
+"""Lazy Page materialization"""
+def build_current_page(branch, page, oldvalue, initiator):
+    """Build a lazily materialized Page when it becomes the current page"""
+    if page is not None:
+        page._build()
+
+event.listen(Branch.current_page, 'set', build_current_page)
+
+
+"""Cached view invalidation"""
+def invalidate_views(branch, item, initiator):
+    branch._invalidate_views()
+
+def invalidate_views_refresh(branch, context, attrs):
+    branch._invalidate_views()
+
+[event.listen(getattr(Branch, attr), identifier, invalidate_views)
+    for attr in ['pages', 'embedded'] for identifier in ['append', 'remove']]
+event.listen(Branch, 'refresh', invalidate_views_refresh)
@@ -5,13 +5,17 @@ Question of certain question types, such as multiple choice, contain a list of C
 1. A text: to be displayed on the page
 2. A value: stored as the Question's data by default
 3. A label: to identify the Choice when the data are downloaded
+
+Compiled html is cached by html version and default status (see html_cache). 
+The version is re-stamped when the Choice's text changes, or when it is 
+added to or removed from a Question.
 """
 
 from hemlock.app import db
-from hemlock.database.private import CompileBase
-from hemlock.database.types import Function, FunctionType
+from hemlock.database.private import CompileBase, html_cache, new_html_version
+from hemlock.database.types import CompactType, Function, FunctionType
 
-from sqlalchemy_mutable import MutableType
+from sqlalchemy import event
 
 
 class Choice(CompileBase, db.Model):
@@ -26,8 +30,9 @@ class Choice(CompileBase, db.Model):
     
     text = db.Column(db.Text)
     label = db.Column(db.Text)
-    value = db.Column(MutableType)
+    value = db.Column(CompactType)
     debug = db.Column(FunctionType)
+    _html_version = db.Column(db.BigInteger)
     
     def __init__(
             self, question=None, index=None,
@@ -46,6 +51,18 @@ class Choice(CompileBase, db.Model):
         """Set text, value, and label to the same value"""
         self.text = self.label = self.value = text
     
+    def get_html(self):
+        """Get compiled html, compiling only if no html is cached for the 
+        current html version"""
+        if self._html_version is None:
+            return self.compile_html()
+        key = (self.model_id, self._html_version, self.is_default())
+        html = html_cache.get(key)
+        if html is None:
+            html = self.compile_html()
+            html_cache.set(key, html)
+        return html
+    
     def compile_html(self):
         question=self.question
         classes = ' '.join(question.choice_div_classes)
@@ -68,6 +85,25 @@ class Choice(CompileBase, db.Model):
             return self in default
         return self == default
 
+
+"""Question packed data cache invalidation"""
+def invalidate_packed_data(choice, value, oldvalue, initiator):
+    if choice.question is not None and value != oldvalue:
+        choice.question._packed_data = None
+
+[event.listen(getattr(Choice, attr), 'set', invalidate_packed_data) 
+    for attr in ['index', 'label', 'value']]
+
+"""Compiled html version stamps"""
+def stamp_html(choice, value, oldvalue, initiator):
+    if value != oldvalue:
+        choice._html_version = new_html_version()
+        if choice.question is not None:
+            choice.question._html_version = new_html_version()
+
+[event.listen(getattr(Choice, attr), 'set', stamp_html) 
+    for attr in ['index', 'text']]
+
 DIV = """
 <div class="{classes}">
     {input}
@@ -1,13 +1,20 @@
-"""Navigation bar database model"""
+"""Navigation bar database model
+
+A Navbar's html version is re-stamped whenever its rows, or the rows of its 
+Brand, Navitems, or Dropdownitems, are flushed with changes. Survey page 
+shells which include the Navbar are cached by html version (see page_shell).
+"""
 
 from hemlock.app import db
-from hemlock.database.private import Base
+from hemlock.database.private import Base, new_html_version
 
+from sqlalchemy import event
 from sqlalchemy_nav import BrandMixin, DropdownitemMixin, NavbarMixin, NavitemMixin
 
 
 class Navbar(NavbarMixin, Base, db.Model):
     pages = db.relationship('Page', backref='nav', lazy='dynamic')
+    _html_version = db.Column(db.BigInteger)
 
 class Brand(BrandMixin, Base, db.Model):
     pass
@@ -16,4 +23,26 @@ class Navitem(NavitemMixin, Base, db.Model):
     pass
     
 class Dropdownitem(DropdownitemMixin, Base, db.Model):
-    pass
\ No newline at end of file
+    pass
+
+
+"""Compiled html version stamps"""
+def get_navbar(obj):
+    """Get the Navbar to which a navigation model belongs"""
+    if isinstance(obj, Dropdownitem):
+        obj = obj.item
+    if isinstance(obj, (Brand, Navitem)):
+        obj = obj.bar
+    return obj if isinstance(obj, Navbar) else None
+
+def stamp_html(session, flush_context, instances):
+    changed = [
+        obj for objs in [session.new, session.dirty, session.deleted] 
+        for obj in objs 
+        if isinstance(obj, (Navbar, Brand, Navitem, Dropdownitem))
+        ]
+    navbars = set([get_navbar(obj) for obj in changed]) - set([None])
+    for navbar in navbars:
+        navbar._html_version = new_html_version()
+
+event.listen(db.session, 'before_flush', stamp_html)
@@ -25,20 +25,28 @@ terminal: indicates this Page is the last in the experiment
 
 Function Columns:
 
+build: run to create the Page's Questions when the Page is first reached
 compile: run before html is compiled
 debug: run during debugging
 navigate: run to create the next Branch to which the experiment navigates
 post: run after data are recorded
+
+A Page with a build function is materialized lazily. Its Questions (and 
+their Choices) are created only when the Page becomes its Branch's current 
+page, so that Participants who leave early do not cost rows for Pages they 
+never saw. The Page itself is created up front, so it can be referenced by 
+back_to and forward_to.
 """
 
 from hemlock.app import db
-from hemlock.database.private import BranchingBase, CompileBase
+from hemlock.database.private import BranchingBase, CompileBase, deferred_flush, get_shell
 from hemlock.database.types import Function, FunctionType, MarkupType
 from hemlock.database.models.question import Question
 
 from datetime import datetime
 from flask import current_app, Markup, render_template, request, url_for
 from flask_login import current_user
+from sqlalchemy import event
 from sqlalchemy.ext.orderinglist import ordering_list
 from sqlalchemy_mutable import MutableListType
 
@@ -67,14 +75,16 @@ class Page(BranchingBase, CompileBase, db.Model):
     back_to = db.relationship(
         'Page', 
         uselist=False, 
-        foreign_keys='Page._back_to_id'
+        foreign_keys='Page._back_to_id',
+        post_update=True
         )
         
     _forward_to_id = db.Column(db.Integer, db.ForeignKey('page.id'))
     forward_to = db.relationship(
         'Page', 
         uselist=False, 
-        foreign_keys='Page._forward_to_id'
+        foreign_keys='Page._forward_to_id',
+        post_update=True
         )
     
     _navbar_id = db.Column(db.Integer, db.ForeignKey('navbar.id'))
@@ -115,6 +125,11 @@ class Page(BranchingBase, CompileBase, db.Model):
     def back(self, back):
         self._back = back
     
+    @property
+    def shell(self):
+        """Compiled css, js, and navbar html (see page_shell)"""
+        return get_shell(self.css, self.js, self.nav)
+    
     @property
     def direction_from(self):
         return self._direction_from
@@ -145,10 +160,11 @@ class Page(BranchingBase, CompileBase, db.Model):
     def forward(self, forward):
         self._forward = forward
     
-    compile = db.Column(FunctionType)
-    debug = db.Column(FunctionType)
+    build = db.Column(FunctionType)
+    compile = db.Column(FunctionType('page_compile'))
+    debug = db.Column(FunctionType('page_debug'))
     navigate = db.Column(FunctionType)
-    post = db.Column(FunctionType)
+    post = db.Column(FunctionType('page_post'))
     
     def __init__(
             self, branch=None, index=None, back_to=None, forward_to=None, 
@@ -156,7 +172,7 @@ class Page(BranchingBase, CompileBase, db.Model):
             back=None, back_button=None, css=None, 
             forward=True, forward_button=None, js=None,
             survey_template=None, terminal=False, view_template=None, 
-            compile=None, debug=None, navigate=None, post=None):        
+            build=None, compile=None, debug=None, navigate=None, post=None):        
         self.set_branch(branch, index)
         self.back_to = back_to
         self.forward_to = forward_to
@@ -174,6 +190,7 @@ class Page(BranchingBase, CompileBase, db.Model):
         self.terminal = terminal
         self.view_template = view_template or current_app.view_template
 
+        self.build = build
         self.compile = compile or current_app.page_compile
         self.debug = debug or current_app.page_debug
         self.navigate = navigate
@@ -211,12 +228,20 @@ class Page(BranchingBase, CompileBase, db.Model):
             )
 
     """Methods executed during study"""
+    def _build(self):
+        """Create the Page's Questions if the Page is not yet built"""
+        if self.build.func is None:
+            return
+        with deferred_flush():
+            self.build(object=self)
+        self.build = None
+    
     def compile_html(self, recompile=True):
         """Compile question html"""
         if self.question_html is None or recompile:
             self.compile(object=self)
             self.question_html = Markup(''.join(
-                [q.compile_html() for q in self.questions]))
+                [q.get_html() for q in self.questions]))
         self.start_time = datetime.utcnow()
         return self.render(render_template(self.survey_template, page=self))
         
@@ -258,5 +283,19 @@ class Page(BranchingBase, CompileBase, db.Model):
         head_part = HEAD_PART if self == self.part.current_page else ''
         head_branch = HEAD_BRANCH if self == self.branch.current_page else ''
         print(indent, self, head_branch, head_part)
-        if self.next_branch in self.part.branch_stack:
-            self.next_branch.view_nav()
\ No newline at end of file
+        if self.part._next_branch_in_stack(self):
+            self.next_branch.view_nav()
+
+
+"""Cached view invalidation (see Branch.questions)"""
+def invalidate_views(page, item, initiator):
+    if page.branch is not None:
+        page.branch._invalidate_views()
+
+def invalidate_views_timer(page, value, oldvalue, initiator):
+    if page.branch is not None:
+        page.branch._invalidate_views()
+
+[event.listen(Page.questions, identifier, invalidate_views)
+    for identifier in ['append', 'remove']]
+event.listen(Page.timer, 'set', invalidate_views_timer)
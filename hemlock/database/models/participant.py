@@ -14,16 +14,28 @@ g: Participant dictionary
 meta: dictionary of Participant metadata
 status: in progress, completed, or timed out
 updated: indicates Participant data has been updated since last store
+
+pages and questions are cached, and the caches are invalidated when Branches 
+are inserted to or removed from the branch_stack, when a Branch's Pages or 
+Questions change (see Branch.questions), or when the Participant is 
+refreshed from the database. The cached lists must not be modified.
+
+The branch stack is indexed for constant-time membership checks. 
+_branch_ids maps the ids of Branches in the branch_stack to the model ids of 
+the Pages or Branches from which they originated. _origin_ids is its inverse.
 """
 
 from hemlock.app.factory import db
-from hemlock.database.private import Base, DataStore
+from hemlock.database.private import Base, DataStore, deferred_flush
 from hemlock.database.types import DataFrame
 from hemlock.database.models.branch import Branch
 
 from datetime import datetime
+from flask import current_app, request
 from flask_login import UserMixin
+from sqlalchemy import event
 from sqlalchemy.ext.orderinglist import ordering_list
+from sqlalchemy.orm import selectinload
 from sqlalchemy_mutable import MutableDictType
 
 def send_data(func):
@@ -37,7 +49,7 @@ def send_data(func):
         return_val = func(part, update)
         if part.previous_status == part.status:
             return return_val
-        DataStore.query.first().update_status(part)
+        DataStore.submit_status(part)
         return return_val
     return status_update
 
@@ -65,16 +77,27 @@ class Participant(UserMixin, Base, db.Model):
         
     @property
     def pages(self):
-        return [p for b in self.branch_stack for p in b.pages]
+        if getattr(self, '_pages_cache', None) is None:
+            self._pages_cache = [p for b in self.branch_stack for p in b.pages]
+        return self._pages_cache
         
     @property
     def questions(self):
-        questions = [q for b in self.branch_stack for q in b.questions]
-        questions.sort(key=lambda q: q.id)
-        return questions
+        if getattr(self, '_questions_cache', None) is None:
+            questions = [q for b in self.branch_stack for q in b.questions]
+            questions.sort(key=lambda q: q.id)
+            self._questions_cache = questions
+        return self._questions_cache
+    
+    def _invalidate_views(self):
+        """Invalidate the cached pages and questions"""
+        self._pages_cache = self._questions_cache = None
     
     _page_htmls = db.relationship('PageHtml', backref='part', lazy='dynamic')
     
+    _branch_ids = db.Column(MutableDictType)
+    _origin_ids = db.Column(MutableDictType)
+    
     g = db.Column(MutableDictType, default={})
     _completed = db.Column(db.Boolean, default=False)
     end_time = db.Column(db.DateTime)
@@ -109,6 +132,68 @@ class Participant(UserMixin, Base, db.Model):
         if self.time_expired:
             return 'timed_out'
         return 'in_progress'
+        
+    @classmethod
+    def load(cls, id, preload=None, refresh=False):
+        """Load a Participant by id
+
+        If preload is True, the Participant's survey graph (branch stack,
+        pages, questions, choices, and validators) is loaded eagerly with one
+        query per relationship, rather than one query per object. By default, 
+        the graph is preloaded if the request endpoint is in the 
+        preload_endpoints setting.
+
+        If refresh is True, objects already in the session are overwritten 
+        with the loaded rows (populate_existing). Use this to reload the 
+        graph after it has been expired, e.g. by a commit.
+        """
+        if preload is None:
+            preload = request.endpoint in current_app.preload_endpoints
+        query = cls.query
+        if preload:
+            query = query.options(*cls.preload_options())
+        if refresh:
+            query = query.populate_existing()
+        return query.filter_by(id=id).first()
+
+    @classmethod
+    def preload_options(cls):
+        """Return loader options to eagerly load the survey graph
+        
+        current_branch and current_page are left to lazy loading. They refer 
+        to objects already in the graph, and eagerly loading them again would 
+        overwrite those objects' preloaded collections on refresh.
+        """
+        from hemlock.database.models import Page, Question
+        branches = selectinload(cls.branch_stack)
+        pages = branches.selectinload(Branch.pages)
+        questions = pages.selectinload(Page.questions)
+        return [
+            branches.selectinload(Branch.embedded),
+            pages.selectinload(Page.timer),
+            ] + [
+            questions.selectinload(getattr(Question, rel))
+            for rel in [
+                'choices', 'selected_choices', 'nonselected_choices',
+                'validators'
+                ]
+            ]
+
+    @classmethod
+    def status_counts(cls):
+        """Count Participants by status in SQL"""
+        counts = {'completed': 0, 'in_progress': 0, 'timed_out': 0}
+        rows = db.session.query(
+            cls._completed, cls._time_expired, db.func.count(cls.id)
+            ).group_by(cls._completed, cls._time_expired)
+        for completed, time_expired, count in rows:
+            if completed:
+                counts['completed'] += count
+            elif time_expired:
+                counts['timed_out'] += count
+            else:
+                counts['in_progress'] += count
+        return counts
     
     def __init__(self, start_navigation, meta={}):
         """Initialize Participant
@@ -116,15 +201,16 @@ class Participant(UserMixin, Base, db.Model):
         Sets up the global dictionary g and metadata. Then initializes the
         root branch.
         """        
-        ds = DataStore.query.first()
-        ds.meta.append(meta)
-        ds.update_status(self)
+        DataStore.submit_status(self, meta)
         
         self.end_time = self.start_time = datetime.utcnow()
         self.meta = meta.copy()
         
-        self.current_branch = root = start_navigation()
+        with deferred_flush():
+            root = start_navigation()
+        self.current_branch = root
         self.branch_stack.append(root)
+        self._index_branch_stack()
         root.current_page = root.start_page
         root._isroot = True
         
@@ -158,7 +244,8 @@ class Participant(UserMixin, Base, db.Model):
         questions = self.questions
         df = DataFrame()
         df.add(data=self.meta, all_rows=True)
-        [df.add(data=q.pack_data(), all_rows=q.all_rows) for q in questions]
+        [df.add(data=q.get_packed_data(), all_rows=q.all_rows) 
+            for q in questions]
         df.pad()
         return df
     
@@ -173,21 +260,35 @@ class Participant(UserMixin, Base, db.Model):
         Pages' Questions. A Page's timer is set before its Questions.
         """
         var_count = {}
-        self.set_order_branch(self.branch_stack[0], var_count)
-    
-    def set_order_branch(self, branch, var_count):
-        """Set the order for Questions belonging to a given Branch"""
-        [self.set_order_question(q, var_count) for q in branch.embedded]
-        [self.set_order_page(p, var_count) for p in branch.pages]
-        if branch.next_branch in self.branch_stack:
-            self.set_order_branch(branch.next_branch, var_count)
+        [self.set_order_question(q, var_count) 
+            for q in self._walk_questions(self.branch_stack[0])]
     
-    def set_order_page(self, page, var_count):
-        """Set the order for Questions belonging to a given Page"""
-        questions = [page.timer]+page.questions
-        [self.set_order_question(q, var_count) for q in questions]
-        if page.next_branch in self.branch_stack:
-            self.set_order_branch(page.next_branch, var_count)
+    def _walk_questions(self, branch):
+        """Iterate over Questions in the order they appeared
+        
+        Branches are walked depth first using an explicit stack, so that 
+        deep Branch chains do not hit the recursion limit.
+        """
+        stack = [self._branch_items(branch)]
+        while stack:
+            item = next(stack[-1], None)
+            if item is None:
+                stack.pop()
+            elif isinstance(item, Branch):
+                stack.append(self._branch_items(item))
+            else:
+                yield item
+                
+    def _branch_items(self, branch):
+        """Iterate over a Branch's Questions and the Branches it leads to"""
+        yield from branch.embedded
+        for page in branch.pages:
+            yield page.timer
+            yield from page.questions
+            if self._next_branch_in_stack(page):
+                yield page.next_branch
+        if self._next_branch_in_stack(branch):
+            yield branch.next_branch
         
     def set_order_question(self, question, var_count):
         """Set the order for a given Question"""
@@ -201,78 +302,121 @@ class Participant(UserMixin, Base, db.Model):
     
     """Forward navigation"""
     def _forward(self, forward_to=None):
-        """Advance forward to specified Page"""
+        """Advance forward to specified Page
+        
+        Jump directly to the Page if possible (see _jump_forward). Otherwise, 
+        advance one Page at a time.
+        """
         if forward_to is None:
             return self._forward_one()
+        if self._jump_forward(forward_to):
+            return
         while self.current_page.id != forward_to.id:
             self._forward_one()
     
+    def _jump_forward(self, forward_to):
+        """Jump forward to a later Page in the current Branch
+        
+        This is possible iff none of the Pages from the current Page up to 
+        (but excluding) forward_to is eligible to insert a Branch. Return 
+        an indicator that the jump was made.
+        """
+        branch, page = self.current_branch, self.current_page
+        if (
+                page is None or forward_to.branch is not branch 
+                or forward_to.index <= page.index
+            ):
+            return False
+        skipped = branch.pages[page.index:forward_to.index]
+        if any(p._eligible_to_insert_branch() for p in skipped):
+            return False
+        branch.current_page = forward_to
+        return True
+    
     def _forward_one(self):
         """Advance forward one page"""
         if self.current_page._eligible_to_insert_branch():
             self._insert_branch(self.current_page)
         else:
             self.current_branch._forward()
-        self._forward_recurse()
+        self._find_next_page()
     
     def _insert_branch(self, origin):
         """Grow and insert new Branch to branch_stack"""
         next_branch = origin._grow_branch()
         self.branch_stack.insert(self.current_branch.index+1, next_branch)
+        self._index_branch(next_branch, origin)
         self._increment_head()
         
-    def _forward_recurse(self):
-        """Recursive forward function
-        
-        Advance forward until the next Page is found (i.e. is not None).
-        """
-        if self.current_page is not None:
-            return
-        if self.current_branch._eligible_to_insert_branch():
-            self._insert_branch(self.current_branch)
-        else:
-            self._decrement_head()
-            self.current_branch._forward()
-        self._forward_recurse()
+    def _find_next_page(self):
+        """Advance forward until the next Page is found (i.e. is not None)"""
+        while self.current_page is None:
+            if self.current_branch._eligible_to_insert_branch():
+                self._insert_branch(self.current_branch)
+            else:
+                assert self.current_branch.index > 0, 'End of survey reached'
+                self._decrement_head()
+                self.current_branch._forward()
     
     """Backward navigation"""
     def _back(self, back_to=None):
-        """Navigate backward to specified Page"""
+        """Navigate backward to specified Page
+        
+        Jump directly to the Page if possible (see _jump_back). Otherwise, 
+        navigate back one Page at a time.
+        """
         if back_to is None:
             return self._back_one()
+        if self._jump_back(back_to):
+            return
         while self.current_page.id != back_to.id:
             self._back_one()
             
+    def _jump_back(self, back_to):
+        """Jump back to an earlier Page in the current Branch
+        
+        This is possible iff none of the Pages from back_to up to (but 
+        excluding) the current Page branches off to a Branch in the 
+        branch_stack. Return an indicator that the jump was made.
+        """
+        branch, page = self.current_branch, self.current_page
+        if (
+                page is None or back_to.branch is not branch 
+                or back_to.index >= page.index
+            ):
+            return False
+        passed = branch.pages[back_to.index:page.index]
+        if any(self._next_branch_in_stack(p) for p in passed):
+            return False
+        branch.current_page = back_to
+        return True
+            
     def _back_one(self):
         """Navigate backward one Page"""      
         if self.current_page == self.current_branch.start_page:
             self._remove_branch()
         else:
             self.current_branch._back()
-        self._back_recurse()
+        self._find_previous_page()
         
     def _remove_branch(self):
         """Remove current branch from the branch stack"""
         self._decrement_head()
-        self.branch_stack.pop(self.current_branch.index+1)
-        
-    def _back_recurse(self):
-        """Recursive back function
+        branch = self.branch_stack.pop(self.current_branch.index+1)
+        self._unindex_branch(branch)
         
-        Navigate backward until previous Page is found.
-        """
-        if self._found_previous_page():
-            return
-        if self.current_page is None:
-            if self.current_branch.next_branch in self.branch_stack:
-                self._increment_head()
-            elif not self.current_branch.pages:
-                self._remove_branch()
+    def _find_previous_page(self):
+        """Navigate backward until previous Page is found"""
+        while not self._found_previous_page():
+            if self.current_page is None:
+                if self._next_branch_in_stack(self.current_branch):
+                    self._increment_head()
+                elif not self.current_branch.pages:
+                    self._remove_branch()
+                else:
+                    self.current_branch._back()
             else:
-                self.current_branch._back()
-        else:
-            self._increment_head()
-        self._back_recurse()
+                self._increment_head()
     
     def _found_previous_page(self):
         """Indicate that previous page has been found in backward navigation
@@ -282,9 +426,52 @@ class Participant(UserMixin, Base, db.Model):
         """
         return (
             self.current_page is not None 
-            and self.current_page.next_branch not in self.branch_stack
+            and not self._next_branch_in_stack(self.current_page)
             )
 
+    """Branch stack index"""
+    def _index_branch_stack(self):
+        """Rebuild the branch stack index"""
+        branch_ids, origin_ids = {}, {}
+        for branch in self.branch_stack:
+            origin = branch.origin_page or branch.origin_branch
+            origin_id = None if origin is None else origin.model_id
+            branch_ids[branch.id] = origin_id
+            if origin_id is not None:
+                origin_ids[origin_id] = branch.id
+        self._branch_ids, self._origin_ids = branch_ids, origin_ids
+        
+    def _branch_stack_index(self):
+        """Return the branch stack index (_branch_ids, _origin_ids)
+        
+        The index is built on first use for Participants created before the 
+        index existed. All index access goes through this method.
+        """
+        if self._branch_ids is None or self._origin_ids is None:
+            self._index_branch_stack()
+        return self._branch_ids, self._origin_ids
+    
+    def _index_branch(self, branch, origin):
+        branch_ids, origin_ids = self._branch_stack_index()
+        origin_id = None if origin is None else origin.model_id
+        branch_ids[branch.id] = origin_id
+        if origin_id is not None:
+            origin_ids[origin_id] = branch.id
+            
+    def _unindex_branch(self, branch):
+        branch_ids, origin_ids = self._branch_stack_index()
+        origin_id = branch_ids.pop(branch.id, None)
+        if origin_id is not None:
+            origin_ids.pop(origin_id, None)
+    
+    def _next_branch_in_stack(self, origin):
+        """Indicate that the next Branch of a Page or Branch is in the 
+        branch_stack
+        
+        This does not load the next Branch.
+        """
+        return origin.model_id in self._branch_stack_index()[1]
+    
     """General navigation and debugging"""
     def _increment_head(self):
         self.current_branch = self.branch_stack[self.current_branch.index+1]
@@ -294,4 +481,16 @@ class Participant(UserMixin, Base, db.Model):
     
     def view_nav(self):
         """Print branch stack for debugging purposes"""
-        self.branch_stack[0].view_nav()
\ No newline at end of file
+        self.branch_stack[0].view_nav()
+
+
+"""Cached view invalidation"""
+def invalidate_views(part, branch, initiator):
+    part._invalidate_views()
+
+def invalidate_views_refresh(part, context, attrs):
+    part._invalidate_views()
+
+[event.listen(Participant.branch_stack, identifier, invalidate_views)
+    for identifier in ['append', 'remove']]
+event.listen(Participant, 'refresh', invalidate_views_refresh)
@@ -6,14 +6,21 @@ Each Question executes 6 tasks:
 html is compiled.
 2. Compile html: The Question compiles html for the client. This html will 
 be inserted into its Page's html when the Participant accesses it, along 
-with the html from other Questions on that Page.
+with the html from other Questions on that Page. Compiled html is cached by 
+html version (see html_cache), and the version is re-stamped when the 
+Question's text, error, default, div classes, choice div classes, choice 
+input type, or choices change.
 3. Record response: The Question records the Participant's response.
 4. Validate response: The Question checks whether the Participant's response 
 was valid by checking with each of its Validators.
 5. Record data: Having received a valid response, the Question records its 
 data. This is usually the raw response or a transformation thereof.
 6. Pack data: The Question packages its data for insertion into the 
-DataStore.
+DataStore. Packed data are cached in the _packed_data column, and the 
+cache is invalidated when the Question's data, order, index, var, all_rows, 
+or choices change. The cache is only written when the Question's row is 
+flushed with other changes, so caching never adds an UPDATE for an 
+otherwise unchanged Question.
 
 Relationships:
 
@@ -45,13 +52,14 @@ post: run after data are recorded
 """
 
 from hemlock.app import db
-from hemlock.database.private import CompileBase
-from hemlock.database.types import FunctionType
+from hemlock.database.private import CompileBase, html_cache, new_html_version
+from hemlock.database.types import CompactType, FunctionType
 
 from flask import current_app
 from flask_login import current_user
+from sqlalchemy import PickleType, event
 from sqlalchemy.ext.orderinglist import ordering_list
-from sqlalchemy_mutable import Mutable, MutableType, MutableModelBase, MutableListType, MutableDictType
+from sqlalchemy_mutable import Mutable, MutableModelBase, MutableListType, MutableDictType
 
 
 class Question(MutableModelBase, CompileBase, db.Model):
@@ -98,19 +106,21 @@ class Question(MutableModelBase, CompileBase, db.Model):
         )
         
     all_rows = db.Column(db.Boolean)
-    data = db.Column(MutableType)
-    _default = db.Column(MutableType)
+    data = db.Column(CompactType)
+    _default = db.Column(CompactType)
     div_classes = db.Column(MutableListType)
     error = db.Column(db.Text)
-    init_default = db.Column(MutableType)
+    init_default = db.Column(CompactType)
     order = db.Column(db.Integer)
-    response = db.Column(MutableType)
+    _packed_data = db.Column(PickleType)
+    response = db.Column(CompactType)
     text = db.Column(db.Text)
     var = db.Column(db.Text)
+    _html_version = db.Column(db.BigInteger)
     
-    compile = db.Column(FunctionType)
-    debug = db.Column(FunctionType)
-    post = db.Column(FunctionType)
+    compile = db.Column(FunctionType('question_compile'))
+    debug = db.Column(FunctionType('question_debug'))
+    post = db.Column(FunctionType('question_post'))
     
     @property
     def default(self):
@@ -155,6 +165,18 @@ class Question(MutableModelBase, CompileBase, db.Model):
         self.default = self.init_default
     
     """Methods executed during study"""
+    def get_html(self):
+        """Get compiled html, compiling only if no html is cached for the 
+        current html version"""
+        if self._html_version is None:
+            return self.compile_html()
+        key = (self.model_id, self._html_version)
+        html = html_cache.get(key)
+        if html is None:
+            html = self.compile_html()
+            html_cache.set(key, html)
+        return html
+    
     def compile_html(self, content=''):
         """HTML compiler"""
         div_classes = self.get_div_classes()
@@ -171,7 +193,7 @@ class Question(MutableModelBase, CompileBase, db.Model):
         """
         div_classes = ' '.join(self.div_classes)
         if self.error is not None:
-            return div_clases + ' error'
+            return div_classes + ' error'
         return div_classes
     
     def get_label(self):
@@ -198,6 +220,12 @@ class Question(MutableModelBase, CompileBase, db.Model):
     def record_data(self):
         self.data = self.response
         
+    def get_packed_data(self):
+        """Get packed data, packing only if the cached data are invalid"""
+        if self._packed_data is None:
+            return self.pack_data()
+        return self._packed_data
+        
     def pack_data(self, data=None):
         """Pack data for storing in DataStore
         
@@ -218,6 +246,85 @@ class Question(MutableModelBase, CompileBase, db.Model):
             if c.label is not None:
                 data[''.join([self.var, c.label, 'Index'])] = c.index
         return data
+        
+
+"""Packed data cache invalidation"""
+PACKED_ATTRS = ['data', 'order', 'index', 'var', 'all_rows']
+
+def invalidate_packed_data(question, value, oldvalue, initiator):
+    if value != oldvalue:
+        question._packed_data = None
+
+def invalidate_packed_data_modified(question, initiator):
+    question._packed_data = None
+
+def invalidate_packed_data_choices(question, choice, initiator):
+    question._packed_data = None
+
+def cache_packed_data(session, flush_context, instances):
+    """Cache the packed data of Questions whose rows are being flushed"""
+    questions = [
+        q for q in session.dirty 
+        if isinstance(q, Question) and q._packed_data is None 
+        and session.is_modified(q)
+        ]
+    for q in questions:
+        q._packed_data = q.pack_data()
+
+[event.listen(
+    getattr(Question, attr), 'set', invalidate_packed_data, propagate=True) 
+    for attr in PACKED_ATTRS]
+event.listen(
+    Question.data, 'modified', invalidate_packed_data_modified, 
+    propagate=True)
+[event.listen(
+    Question.choices, identifier, invalidate_packed_data_choices, 
+    propagate=True)
+    for identifier in ['append', 'remove']]
+event.listen(db.session, 'before_flush', cache_packed_data)
+
+
+"""Compiled html version stamps"""
+HTML_ATTRS = [
+    'text', 'error', '_default', 'div_classes', 
+    'choice_div_classes', 'choice_input_type'
+    ]
+HTML_MUTABLE_ATTRS = ['_default', 'div_classes', 'choice_div_classes']
+
+def stamp_html(question, value, oldvalue, initiator):
+    if value != oldvalue:
+        question._html_version = new_html_version()
+
+def stamp_html_modified(question, initiator):
+    question._html_version = new_html_version()
+
+def stamp_html_choices(question, choice, initiator):
+    question._html_version = choice._html_version = new_html_version()
+
+def stamp_choice_html(question, value, oldvalue, initiator):
+    if value != oldvalue:
+        stamp_choice_html_modified(question, initiator)
+
+def stamp_choice_html_modified(question, initiator):
+    for c in question.choices:
+        c._html_version = new_html_version()
+
+[event.listen(
+    getattr(Question, attr), 'set', stamp_html, propagate=True)
+    for attr in HTML_ATTRS]
+[event.listen(
+    getattr(Question, attr), 'modified', stamp_html_modified, 
+    propagate=True)
+    for attr in HTML_MUTABLE_ATTRS]
+[event.listen(
+    Question.choices, identifier, stamp_html_choices, propagate=True)
+    for identifier in ['append', 'remove']]
+[event.listen(
+    getattr(Question, attr), 'set', stamp_choice_html, propagate=True)
+    for attr in ['choice_div_classes', 'choice_input_type']]
+event.listen(
+    Question.choice_div_classes, 'modified', stamp_choice_html_modified,
+    propagate=True)
 
 DIV = """
 <div id="{id}" class="{classes}">
@@ -4,5 +4,14 @@ These should rarely be modified by the user.
 """
 
 from hemlock.database.private.base import Base, BranchingBase, CompileBase
+from hemlock.database.private.blueprint import static_branch
 from hemlock.database.private.data_store import DataStore
+from hemlock.database.private.html_cache import html_cache, new_html_version
+from hemlock.database.private.id_blocks import deferred_flush
 from hemlock.database.private.page_html import PageHtml
+from hemlock.database.private.page_shell import get_shell
+from hemlock.database.private.participant_data import ParticipantData
+from hemlock.database.private.status_counter import StatusCounter
+from hemlock.database.private.status_log import StatusLog
+from hemlock.database.private.store_sequence import StoreSequence
+from hemlock.database.private.store_update import StoreUpdate
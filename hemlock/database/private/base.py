@@ -1,14 +1,19 @@
 """Base classes for public database models
 
-Base is a generic base class for all Hemlock models. 
+Base is a generic base class for all Hemlock models. Models are flushed on 
+construction, except in a deferred_flush context (see id_blocks).
 
 BranchingBase contains methods for growing and inserting new branches to a 
 Participant's branch_stack. 
 
-CompileBase contains convenience methods for models which compile html.
+CompileBase contains convenience methods for models which compile html. 
+Rendered html is returned as compiled; responses are minified and 
+compressed after the request (see compression). Pretty printing is reserved 
+for view_html, as parsing the html costs more than compiling it.
 """
 
 from hemlock.app.factory import db
+from hemlock.database.private.id_blocks import deferred_flush, next_id
 
 from bs4 import BeautifulSoup
 from flask import Markup
@@ -21,9 +26,17 @@ class Base():
         return type(self).__name__+'-'+str(self.id)
     
     def __init__(self, *args, **kwargs):
-        """Add and flush all models on construction"""
+        """Add and flush all models on construction
+        
+        In a deferred_flush context, the model is assigned a reserved id 
+        instead, and is flushed when the context exits.
+        """
+        id = next_id(self)
         db.session.add(self)
-        db.session.flush([self])
+        if id is None:
+            db.session.flush([self])
+        else:
+            self.id = id
         super().__init__(*args, **kwargs)
     
     def _set_parent(self, parent, index, parent_attr, child_attr):
@@ -53,14 +66,15 @@ class BranchingBase(Base):
         """
         return (
             self.navigate.func is not None
-            and self.next_branch not in self.part.branch_stack
+            and not self.part._next_branch_in_stack(self)
             )
         
     def _grow_branch(self):
         """Grow and return a new branch"""
         from hemlock.database.models import Branch, Page
         
-        next_branch = self.navigate(object=self)
+        with deferred_flush():
+            next_branch = self.navigate(object=self)
         if next_branch is None:
             return
         assert isinstance(next_branch, Branch)
@@ -74,13 +88,13 @@ class BranchingBase(Base):
 
 class CompileBase(Base):
     def render(self, html=None):
-        """Get and prettify compiled html
+        """Get compiled html
         
         CompileBase expects Models which inherit it to have a compile_html() method. The compile_html() method returns raw html.
         """
-        html = self.compile_html() if html is None else html
-        soup = BeautifulSoup(html, 'html.parser')
-        return soup.prettify()
+        return self.compile_html() if html is None else html
     
     def view_html(self, html=None):
-        print(self.render(html))
\ No newline at end of file
+        """Print prettified html"""
+        html = self.compile_html() if html is None else html
+        print(BeautifulSoup(html, 'html.parser').prettify())
\ No newline at end of file
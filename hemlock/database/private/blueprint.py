@@ -0,0 +1,199 @@
+"""Static branch blueprints
+
+A branch builder decorated with static_branch is run once per application.
+The column values of the Branch and its Pages, Questions, Choices, and
+Validators are captured in a blueprint, and the models are deleted. Each
+later call stamps out a copy of the blueprint: the rows are assigned new ids
+(see id_blocks), their foreign keys are remapped, and they are inserted in
+bulk, without running the Python constructors.
+
+Static builders must not depend on their arguments or on the Participant,
+since every Participant receives a copy of the same blueprint. Models which
+are not part of the blueprint (e.g. the Navbar) are referenced, not copied.
+"""
+
+from hemlock.app.factory import db
+from hemlock.database.private.id_blocks import deferred_flush, next_table_id
+from hemlock.database.types import CompactType, FunctionType
+
+from flask import current_app
+from functools import wraps
+from io import BytesIO
+from sqlalchemy import inspect
+from sqlalchemy.types import PickleType
+from sqlalchemy_mutable.model_shell import ModelShell
+from weakref import WeakKeyDictionary
+import pickle
+
+# Blueprints by application and builder
+_blueprints = WeakKeyDictionary()
+
+
+def static_branch(builder):
+    """Decorator for branch builders whose branches are identical across
+    Participants"""
+    @wraps(builder)
+    def stamp(*args, **kwargs):
+        app = current_app._get_current_object()
+        blueprints = _blueprints.setdefault(app, {})
+        blueprint = blueprints.get(builder)
+        if blueprint is None:
+            blueprint = blueprints[builder] = Blueprint(builder, args, kwargs)
+        return blueprint.stamp()
+    return stamp
+
+
+class Blueprint():
+    """Captured rows of a static branch
+
+    Rows are stored by mapper. Mappers are ordered by the first appearance
+    of their tables, which is the order in which the tables are inserted.
+    Foreign keys to rows of the same or a later table are set by an update
+    after the insert.
+    """
+    def __init__(self, builder, args, kwargs):
+        with deferred_flush():
+            branch = builder(*args, **kwargs)
+        db.session.flush()
+        objects = _collect(branch)
+        self.root_id = branch.id
+        self.tables = []
+        self.ids = {}
+        for obj in objects:
+            table = _base_table(type(obj))
+            if table not in self.ids:
+                self.tables.append(table)
+                self.ids[table] = []
+            self.ids[table].append(obj.id)
+        self.rows = {}
+        [
+            self.rows.setdefault(inspect(obj).mapper, []).append(
+                self._capture(obj)
+            )
+            for obj in objects
+        ]
+        [db.session.delete(obj) for obj in objects]
+        db.session.flush()
+
+    def _capture(self, obj):
+        """Capture an object's column values
+
+        Values of pickled columns which reference models in the blueprint
+        are stored pickled, so that the references can be remapped.
+        """
+        values = inspect(obj).dict
+        row = {}
+        for prop in inspect(obj).mapper.column_attrs:
+            value = values.get(prop.key)
+            pickled = isinstance(
+                prop.columns[0].type, (CompactType, FunctionType, PickleType))
+            if value is not None and pickled:
+                value = self._shell_references(value)
+            row[prop.key] = value
+        return row
+
+    def _shell_references(self, value):
+        """Return the value pickled if it references models in the blueprint
+        """
+        found = []
+        def persistent_id(obj):
+            if not isinstance(obj, ModelShell):
+                return None
+            table = _base_table(obj.model_class)
+            if obj.id not in self.ids.get(table, []):
+                return None
+            found.append(obj)
+            return (obj.model_class, obj.id)
+        f = BytesIO()
+        pickler = pickle.Pickler(f)
+        pickler.persistent_id = persistent_id
+        pickler.dump(value)
+        return PickledReferences(f.getvalue()) if found else value
+
+    def stamp(self):
+        """Insert a copy of the blueprint and return its root Branch"""
+        from hemlock.database.models import Branch
+
+        with deferred_flush():
+            new_ids = {
+                table: {id: next_table_id(table) for id in ids}
+                for table, ids in self.ids.items()
+            }
+            updates = {}
+            for mapper, rows in self.rows.items():
+                db.session.bulk_insert_mappings(mapper, [
+                    self._remap(mapper, row, new_ids, updates) for row in rows
+                ])
+            [
+                db.session.bulk_update_mappings(mapper, rows)
+                for mapper, rows in updates.values()
+            ]
+            with db.session.no_autoflush:
+                return Branch.query.get(new_ids[Branch.__table__][self.root_id])
+
+    def _remap(self, mapper, row, new_ids, updates):
+        """Return a row with new ids and remapped foreign keys
+
+        Foreign keys to rows which are not yet inserted are added to
+        updates, by base table.
+        """
+        table = _base_table(mapper)
+        new_row = row.copy()
+        new_row['id'] = new_ids[table][row['id']]
+        update = {}
+        for prop in mapper.column_attrs:
+            value = row[prop.key]
+            if isinstance(value, PickledReferences):
+                new_row[prop.key] = value.load(new_ids)
+                continue
+            if prop.key == 'id' or value is None:
+                continue
+            for fk in prop.columns[0].foreign_keys:
+                target = fk.column.table
+                if value not in new_ids.get(target, {}):
+                    continue
+                new_value = new_ids[target][value]
+                if self.tables.index(target) >= self.tables.index(table):
+                    new_row[prop.key] = None
+                    update[prop.key] = new_value
+                else:
+                    new_row[prop.key] = new_value
+        if update:
+            base_mapper = mapper.base_mapper
+            updates.setdefault(table, (base_mapper, []))[1].append(
+                dict(id=new_row['id'], **update)
+            )
+        return new_row
+
+
+class PickledReferences():
+    """Pickled column value which references models in a blueprint"""
+    def __init__(self, data):
+        self.data = data
+
+    def load(self, new_ids):
+        """Unpickle the value, remapping referenced models to their copies"""
+        def persistent_load(pid):
+            model_class, id = pid
+            shell = ModelShell.__new__(ModelShell)
+            shell.model_class = model_class
+            shell.id = new_ids[_base_table(model_class)][id]
+            return shell
+        unpickler = pickle.Unpickler(BytesIO(self.data))
+        unpickler.persistent_load = persistent_load
+        return unpickler.load()
+
+
+def _base_table(cls_or_mapper):
+    """Return the base table of a model class or mapper"""
+    return inspect(cls_or_mapper).base_mapper.local_table
+
+def _collect(branch):
+    """Return the models of a branch in insertion order"""
+    pages = branch.pages
+    questions = [
+        q for p in pages for q in [p.timer]+p.questions if q is not None
+    ] + branch.embedded
+    choices = [c for q in questions for c in q.choices]
+    validators = [v for q in questions for v in q.validators]
+    return [branch] + pages + questions + choices + validators
@@ -1,31 +1,158 @@
-"""Data store database model"""
+"""Data store database model
+
+Participant data are stored in one of two modes, set by the `data_storage` 
+setting:
+
+participant: each Participant's data are stored in their own ParticipantData 
+    row. The DataFrame of all Participants' data is rebuilt on demand.
+dataframe: all Participants' data are stored in a single DataFrame.
+
+Tables (data, metadata, and the status log) can be exported as CSV text in 
+chunks of rows (see iter_csv), so that downloads can be streamed.
+
+Every write of a Participant's data takes the next store sequence number 
+(see StoreSequence), and the Participant's data are stamped with it. A data 
+export may be restricted to Participants stored since a previous watermark 
+(i.e. the store sequence at the time of a previous export). Such a delta is 
+merged into the previous export with merge_delta.
+
+Participants submit status changes with submit_status. If the 
+write_behind_interval setting is None, the DataStore is updated immediately. 
+Otherwise, the update is queued as a StoreUpdate, and queued updates are 
+applied in batches by a scheduler job (see flush_updates). Participant 
+requests then only insert a StoreUpdate row rather than locking the 
+DataStore row.
+
+Status counts are kept in sharded StatusCounter rows rather than in the 
+DataStore row. The status log is kept in its own StatusLog table. Status 
+changes are broadcast to the participants namespace by a coalescing 
+StatusBroadcaster.
+"""
 
 from hemlock.app.factory import db, socketio
-from hemlock.database.types import DataFrameType
+from hemlock.app.status_broadcaster import StatusBroadcaster
+from hemlock.database.private.participant_data import ParticipantData
+from hemlock.database.private.status_counter import StatusCounter
+from hemlock.database.private.status_log import StatusLog, VARIABLES
+from hemlock.database.private.store_sequence import StoreSequence
+from hemlock.database.private.store_update import StoreUpdate, STORE_STATUS
+from hemlock.database.types import DataFrame, DataFrameType
 
 from datetime import datetime
+from flask import current_app
+from io import StringIO
 from sqlalchemy_mutable import MutableDictType
+import csv
 import json
 import pandas as pd
 
 STATUS = ['completed', 'in_progress', 'timed_out']
-DEFAULT_STATUS = {s: 0 for s in STATUS}
+# Variable identifying Participants in data exports
+ID_VAR = 'ID'
+# Number of ParticipantData rows to load at a time when rebuilding data
+YIELD_PER = 100
+# Tables which can be exported
+TABLES = ['data', 'meta', 'status_log']
 
 
 class DataStore(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    _current_status = db.Column(MutableDictType, default=DEFAULT_STATUS)
-    data = db.Column(DataFrameType, default={})
+    _data = db.Column('data', DataFrameType, default={})
     meta = db.Column(DataFrameType, default={})
-    status_log = db.Column(DataFrameType, default={})
+    # Maps Participant ids to store sequence numbers in dataframe mode
+    _store_seqs = db.Column(MutableDictType, default={})
     
     @property
     def current_status(self):
-        """Add total Participants and time stamp to _current_status"""
-        current_status = self._current_status.copy()
+        return self.status_counts()
+    
+    @property
+    def store_seq(self):
+        """Last store sequence number taken (i.e. the current watermark)"""
+        return StoreSequence.current_value()
+    
+    @property
+    def data(self):
+        """DataFrame of all Participants' data"""
+        if current_app.data_storage == 'dataframe':
+            self._data.compact()
+            return self._data
+        return self.rebuild_data()
+    
+    @classmethod
+    def merge_delta(cls, previous, delta, id_var=ID_VAR):
+        """Merge a delta export into a previous export
+        
+        previous and delta are pandas DataFrames (e.g. read from downloaded 
+        CSV files). Rows of previous whose id_var is in delta are replaced 
+        by delta's rows. The result is stably sorted by id_var, so rows 
+        belonging to the same Participant keep their order.
+        """
+        previous = previous[~previous[id_var].isin(delta[id_var])]
+        merged = pd.concat([previous, delta], ignore_index=True, sort=False)
+        merged = merged.sort_values(id_var, kind='mergesort')
+        return merged.reset_index(drop=True)
+    
+    @classmethod
+    def status_counts(cls):
+        """Sum status counters and add total Participants"""
+        counts = StatusCounter.counts()
+        current_status = {s: int(counts.get(s) or 0) for s in STATUS}
         current_status['total'] = sum([current_status[s] for s in STATUS])
         return current_status
     
+    @classmethod
+    def submit_status(cls, part, meta=None):
+        """Submit a Participant's status change and new metadata
+        
+        Without write-behind, the DataStore row is only loaded if there is 
+        metadata or data to store. In write-behind mode, the update is 
+        queued. The flush job is run early whenever write_behind_batch 
+        updates have been queued.
+        """
+        if current_app.write_behind_interval is None:
+            cls.update_status(part.previous_status, part.status)
+            cls.emit_status()
+            if meta is not None or part.status in STORE_STATUS:
+                ds = cls.query.first()
+                if meta is not None:
+                    ds.meta.append(meta)
+                if part.status in STORE_STATUS:
+                    ds.store_participant(part)
+            return
+        update = StoreUpdate(part, meta)
+        db.session.flush([update])
+        if update.id % current_app.write_behind_batch == 0:
+            current_app.apscheduler.modify_job(
+                'write_behind', next_run_time=datetime.now())
+    
+    @classmethod
+    def flush_updates(cls, batch_size=None):
+        """Apply queued StoreUpdates in batches of batch_size
+        
+        The DataStore row is locked while each batch is applied, so that 
+        concurrent flushes (e.g. from several workers) are serialized. 
+        Return the number of updates applied.
+        """
+        batch_size = batch_size or current_app.write_behind_batch
+        applied = 0
+        # Check for queued updates before locking the DataStore
+        while db.session.query(StoreUpdate.id).first() is not None:
+            ds = cls.query.with_for_update().first()
+            updates = StoreUpdate.query.order_by(StoreUpdate.id)
+            updates = updates.limit(batch_size).all()
+            if not updates:
+                db.session.commit()
+                break
+            [ds.apply_update(update) for update in updates]
+            StoreUpdate.query.filter(
+                StoreUpdate.id.in_([update.id for update in updates])
+                ).delete(synchronize_session=False)
+            db.session.commit()
+            ds.emit_status()
+            applied += len(updates)
+        return applied
+    
     @classmethod
     def pascal(cls, text):
         """Convert text to pascal format"""
@@ -38,41 +165,204 @@ class DataStore(db.Model):
         self.log_status()
     
     def log_status(self):
-        """Append current status to the status log"""
-        current_status = self.current_status
-        current_status['time'] = datetime.utcnow()
-        self.status_log.append(current_status)
+        """Add current status to the status log"""
+        StatusLog(self.current_status)
     
-    def update_status(self, part):
-        """Update current status
+    @classmethod
+    def update_status(cls, previous_status, status):
+        """Move one Participant from previous_status to status
         
-        Store Participant data on completion and time out.
+        Both counters are updated together, in a fixed row order (see 
+        StatusCounter).
         """
-        if part.previous_status is not None:
-            self._current_status[part.previous_status] -= 1
-        self._current_status[part.status] += 1
-        current_status = json.dumps(self.current_status)
-        socketio.emit('json', current_status, namespace='/participants-nsp')
-        if part.status in ['completed', 'timed_out']:
-            self.store_participant(part)
+        amounts = {status: 1}
+        if previous_status is not None:
+            amounts[previous_status] = amounts.get(previous_status, 0) - 1
+        StatusCounter.add(amounts)
+    
+    @classmethod
+    def emit_status(cls):
+        """Broadcast current status to the participants namespace"""
+        broadcaster.notify()
+        
+    def apply_update(self, update):
+        """Apply a queued StoreUpdate"""
+        if update.meta is not None:
+            self.meta.append(update.meta)
+        self.update_status(update.previous_status, update.status)
+        if update.data is not None:
+            self.store_data(update.part_id, update.data)
     
     def store_participant(self, part):
         """Store data for given Participant"""
-        self.remove_participant(part)
-        self.data.append(part.data)
+        self.store_data(part.id, part.data)
         part.updated = False
         
+    def store_data(self, part_id, data):
+        """Store data for the Participant with the given id
+        
+        In participant storage mode, only the Participant's own row and the 
+        store sequence counter are written. In dataframe storage mode, the Participant's previous rows 
+        are tombstoned and their new rows are appended.
+        """
+        seq = StoreSequence.next_value()
+        if current_app.data_storage == 'dataframe':
+            self._data.append(data, id=part_id)
+            self._store_seqs[part_id] = seq
+        else:
+            row = ParticipantData.query.get(part_id)
+            row = row or ParticipantData(part_id)
+            row.data = data
+            row.seq = seq
+        
     def remove_participant(self, part):
         """Remove data for given Participant"""
-        id_var = self.data.get('ID')
-        if id_var is None or part.id not in id_var:
-            return
-        end = start = id_var.index(part.id)
-        while end < len(id_var) and id_var[end] == part.id:
-            end += 1
-        self.data.remove(start, end)
+        if current_app.data_storage == 'dataframe':
+            self._data.remove_id(part.id)
+            self._store_seqs.pop(part.id, None)
+        else:
+            ParticipantData.query.filter_by(part_id=part.id).delete()
+    
+    def rebuild_data(self):
+        """Rebuild the DataFrame of all Participants' data
+        
+        Participants are appended in id order. Rows are loaded in batches so 
+        that only a few Participants' pickled data are held at once.
+        """
+        df = DataFrame()
+        rows = ParticipantData.query.order_by(ParticipantData.part_id)
+        [df.append(row.data) for row in rows.yield_per(YIELD_PER)]
+        return df
+        
+    def to_pandas(self):
+        """Export all Participants' data to a pandas DataFrame
+        
+        Numeric and boolean variables are exported without copying.
+        """
+        return self.data.to_pandas()
+        
+    def iter_csv(
+            self, table='data', chunk_size=None, since=None, 
+            start=None, end=None, bucket=None):
+        """Generate a table as CSV text
+        
+        table is one of TABLES. The header is yielded first, followed by 
+        chunk_size rows at a time (download_chunk_size by default). In 
+        participant storage mode, Participants' data are loaded in batches, 
+        so memory use does not grow with the number of Participants.
+        
+        If since is given, the data table is restricted to Participants 
+        stored after the store sequence number since. The status log is 
+        restricted to the time range start to end, and downsampled to the 
+        last entry in each bucket (timedelta) if bucket is given.
+        
+        A data table without variables (e.g. a delta in which no 
+        Participants were stored) has an ID_VAR header, so that it can still 
+        be read and merged.
+        
+        Progress is emitted to the participants namespace after each chunk.
+        """
+        chunk_size = chunk_size or current_app.download_chunk_size
+        if table == 'data' and current_app.data_storage != 'dataframe':
+            variables, total = self._participant_data_shape(since)
+            chunks = self._iter_participant_rows(variables, since)
+        elif table == 'data' and since is not None:
+            df = self.data
+            ids = sorted(
+                [id for id, seq in self._store_seqs.items() if seq > since])
+            ranges = [df._row_index[id] for id in ids]
+            variables = list(df.keys())
+            total = sum([end-start for start, end in ranges])
+            chunks = df.iter_rows(variables, ids=ids)
+        elif table == 'status_log':
+            variables = VARIABLES
+            total = None
+            if bucket is None:
+                total = StatusLog.query_range(start, end).count()
+            entries = StatusLog.iter_entries(start, end, bucket)
+            chunks = ([entry] for entry in entries)
+        else:
+            df = self.data if table == 'data' else getattr(self, table)
+            df.compact()
+            variables, total = list(df.keys()), df.rows()
+            chunks = df.iter_rows(variables, chunk_size)
+        if table == 'data' and not variables:
+            variables = [ID_VAR]
+        chunks = self._rechunk(chunks, chunk_size)
+        buffer = StringIO()
+        writer = csv.writer(buffer)
+        writer.writerow(variables)
+        yield self._flush_csv(buffer)
+        self._emit_progress(table, 0, total)
+        written = 0
+        for chunk in chunks:
+            writer.writerows(chunk)
+            yield self._flush_csv(buffer)
+            written += len(chunk)
+            self._emit_progress(table, written, total)
+    
+    def _participant_data_shape(self, since=None):
+        """Return all variables (in order of appearance) and number of rows
+        
+        Only the variables and rows columns of ParticipantData are loaded.
+        """
+        variables, total = {}, 0
+        shapes = self._filter_since(db.session.query(
+            ParticipantData.variables, ParticipantData.rows
+            ), since)
+        for part_vars, rows in shapes.yield_per(YIELD_PER):
+            variables.update(dict.fromkeys(part_vars))
+            total += rows
+        return list(variables), total
+    
+    def _iter_participant_rows(self, variables, since=None):
+        """Iterate over the rows of each Participant's data
+        
+        ParticipantData rows are expunged once their data are read.
+        """
+        rows = self._filter_since(ParticipantData.query, since)
+        for row in rows.yield_per(YIELD_PER):
+            yield from row.data.iter_rows(variables)
+            db.session.expunge(row)
+            
+    def _filter_since(self, query, since=None):
+        """Filter ParticipantData query by store sequence and order by id"""
+        if since is not None:
+            query = query.filter(ParticipantData.seq > since)
+        return query.order_by(ParticipantData.part_id)
+    
+    def _rechunk(self, chunks, chunk_size):
+        """Regroup chunks of rows into chunks of chunk_size rows"""
+        chunk = []
+        for rows in chunks:
+            chunk.extend(rows)
+            while len(chunk) >= chunk_size:
+                yield chunk[:chunk_size]
+                chunk = chunk[chunk_size:]
+        if chunk:
+            yield chunk
+    
+    def _flush_csv(self, buffer):
+        """Return and clear the contents of a CSV buffer"""
+        text = buffer.getvalue()
+        buffer.seek(0)
+        buffer.truncate()
+        return text
+    
+    def _emit_progress(self, table, written, total):
+        progress = json.dumps(
+            {'table': table, 'written': written, 'total': total})
+        socketio.emit(
+            'download_progress', progress, namespace='/participants-nsp')
         
     def print_data(self, data=None):
         data = self.data if data is None else data
-        df = pd.DataFrame(data)
-        print(df)
\ No newline at end of file
+        if isinstance(data, DataFrame):
+            df = data.to_pandas()
+        else:
+            df = pd.DataFrame(data)
+        print(df)
+
+
+broadcaster = StatusBroadcaster(
+    snapshot=lambda: json.dumps(DataStore.status_counts()))
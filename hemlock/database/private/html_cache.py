@@ -0,0 +1,53 @@
+"""Compiled html fragment cache
+
+Questions and Choices cache their compiled html in a process-wide least
+recently used cache, as do survey page shells (see page_shell). Fragments
+are keyed by model id and html version. The html version is a column which
+is re-stamped whenever an attribute that affects the model's html changes,
+so a cached fragment is never served for a model that has changed, in this
+process or another.
+
+Versions are random stamps rather than counters, so that a new row which
+reuses a deleted row's id cannot match the deleted row's fragments.
+"""
+
+from collections import OrderedDict
+from random import getrandbits
+from threading import Lock
+
+# Maximum number of cached fragments
+HTML_CACHE_SIZE = 10000
+# Bits of an html version stamp (fits a signed 64 bit integer column)
+VERSION_BITS = 62
+
+
+class HtmlCache():
+    """Least recently used cache of compiled html"""
+    def __init__(self, size=HTML_CACHE_SIZE):
+        self.size = size
+        self._html = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, key):
+        """Return the cached html, or None if the key is not cached"""
+        with self._lock:
+            html = self._html.get(key)
+            if html is not None:
+                self._html.move_to_end(key)
+            return html
+
+    def set(self, key, html):
+        """Cache the html, evicting the least recently used fragment if the
+        cache is full"""
+        with self._lock:
+            self._html[key] = html
+            self._html.move_to_end(key)
+            if len(self._html) > self.size:
+                self._html.popitem(last=False)
+
+
+html_cache = HtmlCache()
+
+def new_html_version():
+    """Return a new html version stamp"""
+    return getrandbits(VERSION_BITS)
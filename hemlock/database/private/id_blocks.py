@@ -0,0 +1,112 @@
+"""Deferred flush and id block allocation
+
+By default, models are added and flushed on construction (see Base), which
+costs one INSERT round trip per model. In a deferred_flush context, models
+are instead assigned ids from blocks reserved in advance, and the whole tree
+of new models is flushed once when the context exits. Because the models
+already have primary keys, their rows are inserted in bulk.
+
+On PostgreSQL, blocks are drawn from each table's id sequence, so reserved
+ids are unique across processes. Blocks are shared by the process, and
+unused ids are kept for later contexts. On other databases (e.g. SQLite),
+blocks start after the larger of the table's maximum id and the last id
+assigned in the context. These blocks assume a single writer, and are
+discarded when the context exits.
+
+A model in a deferred_flush context has an id, but no identity until it is
+flushed. Storing it in a Mutable column (e.g. a Question's default) flushes
+the session (see MutableSession).
+"""
+
+from hemlock.app.factory import db
+
+from contextlib import contextmanager
+from sqlalchemy import func, text
+from sqlalchemy_mutable import MutableManager
+from threading import Lock
+
+# Number of ids to reserve at a time
+ID_BLOCK_SIZE = 100
+# Session info key of the id blocks of the current context
+SESSION_KEY = 'id_blocks'
+
+
+class IdBlocks():
+    """Blocks of reserved ids, by table"""
+    def __init__(self, sequences=False):
+        self.sequences = sequences
+        self._blocks = {}
+        self._last_ids = {}
+        self._lock = Lock()
+
+    def next_id(self, table):
+        """Return the next reserved id for the table"""
+        with self._lock:
+            block = self._blocks.get(table.name)
+            if not block:
+                block = self._blocks[table.name] = self._reserve(table)
+            id = self._last_ids[table.name] = block.pop()
+            return id
+
+    def _reserve(self, table):
+        """Reserve a block of ids, returned in descending order"""
+        if self.sequences:
+            ids = db.session.execute(
+                text('SELECT nextval(:seq) FROM generate_series(1, :n)'),
+                {'seq': table.name+'_id_seq', 'n': ID_BLOCK_SIZE}
+                )
+            return sorted([id for (id,) in ids], reverse=True)
+        with db.session.no_autoflush:
+            max_id = db.session.query(func.max(table.c.id)).scalar() or 0
+        start = max(max_id, self._last_ids.get(table.name, 0)) + 1
+        return list(range(start+ID_BLOCK_SIZE-1, start-1, -1))
+
+
+class MutableSession():
+    """Session through which Mutable columns store new models
+
+    Mutable columns store models by identity, and flush models which do not
+    have one yet. The whole session is flushed, so that rows referenced by 
+    the model are inserted before it.
+    """
+    def add(self, model):
+        db.session.add(model)
+
+    def flush(self, objects=None):
+        db.session.flush()
+
+
+MutableManager.session = MutableSession()
+shared_id_blocks = IdBlocks(sequences=True)
+
+@contextmanager
+def deferred_flush():
+    """Defer flushing of models constructed in this context
+
+    New models are flushed together when the outermost context exits. If
+    an exception is raised, nothing is flushed.
+    """
+    info = db.session.info
+    if SESSION_KEY in info:
+        yield
+        return
+    postgres = db.engine.dialect.name == 'postgresql'
+    info[SESSION_KEY] = shared_id_blocks if postgres else IdBlocks()
+    try:
+        yield
+    finally:
+        del info[SESSION_KEY]
+    db.session.flush()
+
+def next_id(model):
+    """Return a reserved id for the model, or None outside a deferred_flush
+    context"""
+    return next_table_id(model.__mapper__.base_mapper.local_table)
+
+def next_table_id(table):
+    """Return a reserved id for a row of the table, or None outside a 
+    deferred_flush context"""
+    id_blocks = db.session.info.get(SESSION_KEY)
+    if id_blocks is None:
+        return None
+    return id_blocks.next_id(table)
@@ -0,0 +1,50 @@
+"""Survey page shell
+
+The shell of a survey page is the html it shares with other pages: its css
+link tags, js script tags, and navbar. Pages with the same css, js, and
+navbar share a shell, which is compiled once and cached (see html_cache), so
+that rendering a page only fills in its question html and buttons.
+
+Shells are keyed by the navbar's html version, which is re-stamped when its
+rows change (see Navbar), by the request's url rule, which determines the
+active navbar item, and by the digest of the application's fingerprinted
+static assets (see static_assets).
+"""
+
+from hemlock.app.static_assets import asset_url
+from hemlock.database.private.html_cache import html_cache
+
+from flask import Markup, current_app, request
+
+STYLE = Markup(
+    '<link rel="stylesheet" type="text/css" href="{href}"/>\n')
+SCRIPT = Markup(
+    '<script type="text/javascript" src="{src}"></script>\n')
+
+
+class PageShell():
+    """Compiled css, js, and navbar html"""
+    def __init__(self, css, js, nav):
+        self.styles = Markup('').join(
+            [STYLE.format(href=asset_url(f)) for f in css])
+        self.scripts = Markup('').join(
+            [SCRIPT.format(src=asset_url(f)) for f in js])
+        self.navbar = Markup('') if nav is None else nav.render()
+
+
+def get_shell(css, js, nav):
+    """Get the shell for the css, js, and navbar, compiling only if no shell
+    is cached"""
+    if nav is not None and nav._html_version is None:
+        return PageShell(css, js, nav)
+    key = (
+        'PageShell', tuple(css), tuple(js), request.script_root,
+        current_app.static_assets.digest,
+        None if nav is None else (nav.model_id, nav._html_version),
+        str(request.url_rule)
+        )
+    shell = html_cache.get(key)
+    if shell is None:
+        shell = PageShell(css, js, nav)
+        html_cache.set(key, shell)
+    return shell
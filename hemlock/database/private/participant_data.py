@@ -0,0 +1,39 @@
+"""Participant data database model
+
+Each Participant's packed data are stored in their own row, keyed by the
+Participant's id. Storing or replacing a Participant's data therefore writes
+only that Participant's data, rather than the entire dataset.
+
+The variable names and number of rows are stored alongside the data, so that 
+a data download can write its header and report progress without loading 
+every Participant's data. seq is the DataStore's store sequence number at 
+the time the data were last stored.
+"""
+
+from hemlock.app.factory import db
+from hemlock.database.types import DataFrameType
+
+from sqlalchemy import PickleType
+
+
+class ParticipantData(db.Model):
+    part_id = db.Column(
+        db.Integer, db.ForeignKey('participant.id'), primary_key=True)
+    _data = db.Column('data', DataFrameType, default={})
+    variables = db.Column(PickleType, default=[])
+    rows = db.Column(db.Integer, default=0)
+    seq = db.Column(db.Integer, index=True)
+    
+    @property
+    def data(self):
+        return self._data
+    
+    @data.setter
+    def data(self, data):
+        self._data = data
+        self.variables = list(data.keys())
+        self.rows = self._data.rows()
+    
+    def __init__(self, part_id):
+        self.part_id = part_id
+        db.session.add(self)
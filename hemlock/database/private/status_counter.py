@@ -0,0 +1,83 @@
+"""Status counter database model
+
+Participant status counts are stored as counter rows, one per status and
+shard. Counters are incremented and decremented atomically in SQL, so
+concurrent updates are neither lost nor serialized on a single row. Each
+update goes to a random shard; the count of a status is the sum over its
+shards. A shard may therefore hold a negative count.
+
+An update locks the counter rows it changes until its transaction commits. 
+Rows are always updated in order of (status, shard), so that transactions 
+which update the same counters in opposite directions (e.g. completed to 
+in_progress and in_progress to completed) cannot deadlock.
+
+Counts are periodically reconciled with the Participant table to correct
+any drift (see reconcile).
+"""
+
+from hemlock.app.factory import db
+
+from flask import current_app
+from sqlalchemy import func
+import random
+
+
+class StatusCounter(db.Model):
+    status = db.Column(db.String(16), primary_key=True)
+    shard = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, default=0)
+
+    @classmethod
+    def init_shards(cls, statuses, shards):
+        """Create any missing counter rows"""
+        existing = set(db.session.query(cls.status, cls.shard))
+        [db.session.add(cls(status=status, shard=shard, count=0))
+            for status in statuses for shard in range(shards)
+            if (status, shard) not in existing]
+
+    @classmethod
+    def increment(cls, status, amount=1):
+        """Atomically add amount to a random shard of the status counter"""
+        cls.add({status: amount})
+
+    @classmethod
+    def add(cls, amounts):
+        """Atomically add amounts to random shards of the status counters
+
+        amounts maps statuses to amounts. Rows are updated in order of 
+        (status, shard).
+        """
+        shards = current_app.status_counter_shards
+        cls._update(sorted([
+            (status, random.randrange(shards), amount)
+            for status, amount in amounts.items() if amount
+            ]))
+
+    @classmethod
+    def _update(cls, updates):
+        """Add amounts to counter rows given as (status, shard, amount)"""
+        [cls.query.filter_by(status=status, shard=shard).update(
+            {cls.count: cls.count + amount}, synchronize_session=False)
+            for status, shard, amount in updates]
+
+    @classmethod
+    def counts(cls):
+        """Return a dictionary mapping statuses to counts summed over shards"""
+        counts = db.session.query(cls.status, func.sum(cls.count))
+        return dict(counts.group_by(cls.status))
+
+    @classmethod
+    def reconcile(cls, actual):
+        """Correct drift from the actual counts
+
+        actual maps statuses to counts. The difference between each actual
+        and stored count is added to shard 0. Return the differences.
+        """
+        drift = {
+            status: actual.get(status, 0) - count
+            for status, count in cls.counts().items()
+            }
+        cls._update(sorted([
+            (status, 0, amount) for status, amount in drift.items() if amount
+            ]))
+        return drift
@@ -0,0 +1,72 @@
+"""Status log database model
+
+Each StatusLog row records the Participants' status counts at a given time.
+Rows are indexed by time, so that the log can be queried by time range
+without loading the entire log. Queries may be downsampled into buckets
+(e.g. hourly), keeping the last entry in each bucket.
+"""
+
+from hemlock.app.factory import db
+
+from datetime import datetime
+
+# Status log variables, in the order in which they are exported
+VARIABLES = ['completed', 'in_progress', 'timed_out', 'total', 'time']
+# Number of rows to load at a time
+YIELD_PER = 1000
+EPOCH = datetime(1970, 1, 1)
+
+
+class StatusLog(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    completed = db.Column(db.Integer)
+    in_progress = db.Column(db.Integer)
+    timed_out = db.Column(db.Integer)
+    total = db.Column(db.Integer)
+    time = db.Column(db.DateTime, index=True)
+
+    @classmethod
+    def query_range(cls, start=None, end=None):
+        """Query entries with start <= time < end, ordered by time
+
+        Only the VARIABLES columns are selected.
+        """
+        query = db.session.query(*[getattr(cls, var) for var in VARIABLES])
+        if start is not None:
+            query = query.filter(cls.time >= start)
+        if end is not None:
+            query = query.filter(cls.time < end)
+        return query.order_by(cls.time)
+
+    @classmethod
+    def iter_entries(cls, start=None, end=None, bucket=None):
+        """Iterate over entries as tuples ordered as VARIABLES
+
+        bucket is an optional timedelta. If given, only the last entry in
+        each bucket is yielded.
+        """
+        entries = cls.query_range(start, end).yield_per(YIELD_PER)
+        if bucket is None:
+            yield from entries
+            return
+        last = last_bucket = None
+        for entry in entries:
+            entry_bucket = (entry.time - EPOCH) // bucket
+            if last is not None and entry_bucket != last_bucket:
+                yield last
+            last, last_bucket = entry, entry_bucket
+        if last is not None:
+            yield last
+
+    @classmethod
+    def to_dicts(cls, start=None, end=None, bucket=None):
+        """List entries as dictionaries with time in ISO format"""
+        return [
+            dict(zip(VARIABLES[:-1], entry[:-1]), time=entry.time.isoformat())
+            for entry in cls.iter_entries(start, end, bucket)
+            ]
+
+    def __init__(self, current_status, time=None):
+        [setattr(self, var, current_status[var]) for var in VARIABLES[:-1]]
+        self.time = time or datetime.utcnow()
+        db.session.add(self)
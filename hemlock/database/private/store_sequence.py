@@ -0,0 +1,45 @@
+"""Store sequence database model
+
+A single counter row numbers writes of Participant data. A data export's
+watermark is the sequence number at the time of the export (see
+DataStore.iter_csv).
+
+The counter is incremented atomically in SQL. The increment locks the
+counter row until the storing transaction commits, so sequence numbers
+become visible in the order in which they were taken. Hence, every store
+with a sequence number at or below a watermark has committed by the time
+the watermark is read, and a later export since that watermark cannot miss
+it. (A database sequence would not lock, but a store could then commit
+after a watermark above its sequence number had been handed out.)
+
+The counter is kept in its own row, so that Participant stores do not write
+to the DataStore row.
+"""
+
+from hemlock.app.factory import db
+
+# Id of the counter row
+COUNTER_ID = 1
+
+
+class StoreSequence(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    value = db.Column(db.Integer, default=0)
+
+    @classmethod
+    def init_counter(cls):
+        """Create the counter row if missing"""
+        if cls.query.get(COUNTER_ID) is None:
+            db.session.add(cls(id=COUNTER_ID, value=0))
+
+    @classmethod
+    def next_value(cls):
+        """Atomically increment the counter and return the new value"""
+        cls.query.filter_by(id=COUNTER_ID).update(
+            {cls.value: cls.value + 1}, synchronize_session=False)
+        return cls.current_value()
+
+    @classmethod
+    def current_value(cls):
+        """Return the last sequence number taken"""
+        return db.session.query(cls.value).filter_by(id=COUNTER_ID).scalar()
@@ -0,0 +1,66 @@
+"""Store update database model
+
+In write-behind mode (see the write_behind_interval setting), Participants
+do not update the DataStore directly. Instead, each status change inserts a
+StoreUpdate row. A scheduler job applies queued StoreUpdates to the DataStore
+in batches (see DataStore.flush_updates).
+
+A StoreUpdate records:
+
+1. A status delta: the Participant's previous and new status
+2. New metadata (optional): appended to the DataStore metadata
+3. A data payload (optional): the Participant's data on completion or time
+out, stored when the update is applied
+"""
+
+from hemlock.app.factory import db
+from hemlock.database.types import DataFrameType
+
+from sqlalchemy import PickleType
+
+# Statuses on which Participant data are stored
+STORE_STATUS = ['completed', 'timed_out']
+
+
+class StoreUpdate(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    previous_status = db.Column(db.String(16))
+    status = db.Column(db.String(16))
+    meta = db.Column(PickleType)
+    part_id = db.Column(db.Integer)
+    data = db.Column(DataFrameType)
+
+    @classmethod
+    def pending_counts(cls):
+        """Return the net status changes of queued updates"""
+        counts = {}
+        for column, sign in [(cls.status, 1), (cls.previous_status, -1)]:
+            rows = db.session.query(column, db.func.count(cls.id))
+            rows = rows.filter(column.isnot(None)).group_by(column)
+            for status, count in rows:
+                counts[status] = counts.get(status, 0) + sign*count
+        return counts
+    
+    @classmethod
+    def pending_meta(cls):
+        """Return the metadata of queued updates as a dictionary of lists
+        
+        Metadata only reach the DataStore when the queue is flushed. Use 
+        this to check for duplicate visitors in the meantime.
+        """
+        meta = {}
+        for (update_meta,) in db.session.query(cls.meta).filter(
+                cls.meta.isnot(None)):
+            [meta.setdefault(key, []).append(val) 
+                for key, val in update_meta.items()]
+        return meta
+
+    def __init__(self, part, meta=None):
+        self.previous_status = part.previous_status
+        self.status = part.status
+        self.meta = meta
+        if part.status in STORE_STATUS:
+            self.part_id = part.id
+            self.data = part.data
+            part.updated = False
+        db.session.add(self)
@@ -1,5 +1,6 @@
 """Custom Hemlock database types"""
 
+from hemlock.database.types.compact import CompactType, migrate_compact_columns
 from hemlock.database.types.data_frame import DataFrame, DataFrameType
 from hemlock.database.types.function import Function, FunctionType
 from hemlock.database.types.markup import MarkupType
\ No newline at end of file
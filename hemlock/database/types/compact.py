@@ -0,0 +1,136 @@
+"""Compact mutable database type
+
+A drop-in replacement for sqlalchemy_mutable's MutableType which stores
+values as JSON instead of pickles. Strings, numbers, booleans, and lists and
+dicts (with string keys) of these are stored as JSON. Database models (e.g.
+the Choices of a SingleChoice response) are stored as references,
+{"$ref": [<class name>, <id>]}, and load as ModelShells. Any other value
+(e.g. a datetime or a tuple) is pickled as before.
+
+Values written by MutableType are pickles, and still load. They are
+re-encoded when they change, or in bulk with migrate_compact_columns.
+"""
+
+from hemlock.app.factory import db
+
+from sqlalchemy import bindparam, select, type_coerce
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from sqlalchemy_mutable import (
+    CoercedBool, CoercedFloat, CoercedInt, CoercedStr, Mutable, MutableDict,
+    MutableList
+)
+from sqlalchemy_mutable.model_shell import ModelShell
+import json
+import pickle
+
+# Key of model references
+REF = '$ref'
+# Types stored as JSON scalars, mapped to their JSON type
+SCALAR_TYPES = {
+    bool: bool, float: float, int: int, str: str,
+    CoercedFloat: float, CoercedInt: int, CoercedStr: str
+}
+LIST_TYPES = (list, MutableList)
+DICT_TYPES = (dict, MutableDict)
+
+
+class CompactType(TypeDecorator):
+    impl = LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        try:
+            return json.dumps(
+                encode(value), separators=(',', ':'), allow_nan=False
+            ).encode()
+        except (TypeError, ValueError):
+            return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        value = bytes(value)
+        if value.startswith(pickle.PROTO):
+            return pickle.loads(value)
+        return json.loads(value, object_hook=decode_reference)
+
+
+Mutable.associate_with(CompactType)
+
+
+def encode(value):
+    """Convert a value to JSON-serializable objects
+
+    Raise a TypeError if the value cannot be stored as JSON.
+    """
+    if value is None:
+        return None
+    json_type = SCALAR_TYPES.get(type(value))
+    if json_type is not None:
+        return json_type(value)
+    if type(value) is CoercedBool:
+        return value.value
+    if isinstance(value, ModelShell):
+        return encode_reference(value)
+    if type(value) in LIST_TYPES:
+        return [encode(item) for item in list.__iter__(value)]
+    if type(value) in DICT_TYPES:
+        if not all(SCALAR_TYPES.get(type(k)) is str for k in value):
+            raise TypeError('Dict keys must be strings to be stored as JSON')
+        if REF in value:
+            raise TypeError('Dict key {} is reserved'.format(REF))
+        return {str(key): encode(item) for key, item in dict.items(value)}
+    raise TypeError('Object of type {} cannot be stored as JSON'.format(
+        type(value).__name__))
+
+def encode_reference(shell):
+    """Encode a model reference by class name and id"""
+    name = shell.model_class.__name__
+    if db.Model._decl_class_registry.get(name) is not shell.model_class:
+        raise TypeError('Model class {} is not unique'.format(name))
+    return {REF: [name, shell.id]}
+
+def decode_reference(obj):
+    """Decode a model reference (json object hook)"""
+    if len(obj) != 1 or REF not in obj:
+        return obj
+    name, id = obj[REF]
+    shell = ModelShell.__new__(ModelShell)
+    shell.model_class = db.Model._decl_class_registry[name]
+    shell.id = id
+    return shell
+
+def migrate_compact_columns(chunk_size=1000):
+    """Re-encode pickled values of all CompactType columns
+
+    Rows are read and rewritten in chunks by id, and each chunk is committed
+    separately. Pickled values which cannot be stored as JSON remain pickled.
+    """
+    [
+        migrate_column(column, chunk_size)
+        for table in db.metadata.tables.values() for column in table.columns
+        if isinstance(column.type, CompactType)
+    ]
+
+def migrate_column(column, chunk_size):
+    """Re-encode a column's pickled values"""
+    table, raw, last_id = column.table, type_coerce(column, LargeBinary), 0
+    update = table.update().where(table.c.id == bindparam('_id')).values(
+        {column.name: bindparam('_value', type_=column.type)})
+    while True:
+        rows = db.session.execute(
+            select([table.c.id, raw]).where(table.c.id > last_id)
+            .order_by(table.c.id).limit(chunk_size)
+        ).fetchall()
+        if not rows:
+            return
+        values = [
+            {'_id': id, '_value': pickle.loads(bytes(value))}
+            for id, value in rows
+            if value is not None and bytes(value).startswith(pickle.PROTO)
+        ]
+        if values:
+            db.session.execute(update, values)
+        db.session.commit()
+        last_id = rows[-1][0]
@@ -1,21 +1,213 @@
-"""DataFrame mutable object and column type"""
+"""DataFrame mutable object and column type
 
+A DataFrame maps variable names to Variables (columns). It tracks its number 
+of rows incrementally, and may index the rows belonging to an id (e.g. a 
+Participant id) so that these rows can be replaced without scanning or 
+rebuilding the DataFrame.
+
+Variables store numeric and boolean data in compact arrays (see Variable).
+
+Replaced rows are tombstoned rather than removed. Tombstoned rows are removed 
+in a single pass when they make up at least half of the DataFrame, or when the 
+DataFrame is compacted explicitly (e.g. before downloading).
+"""
+
+from array import array
+from bisect import bisect_right
+from itertools import accumulate, zip_longest
 from sqlalchemy import PickleType
-from sqlalchemy_mutable import MutableList, MutableDict
+from sqlalchemy_mutable import Mutable, MutableDict
+import numpy as np
+import pandas as pd
+
+# Compact when tombstoned rows make up at least this fraction of all rows
+COMPACT_RATIO = .5
+
+# Compact Variable dtypes
+DTYPES = [None, 'bool', 'int', 'float']
+# Initial array typecodes for each compact dtype
+TYPECODES = {None: 'B', 'bool': 'B', 'int': 'b', 'float': 'd'}
+# Integer array typecodes in order of width, with their (min, max) values
+INT_TYPECODES = {
+    tc: (-2**(8*array(tc).itemsize-1), 2**(8*array(tc).itemsize-1)-1) 
+    for tc in ['b', 'h', 'i', 'q']
+    }
+PY_TYPES = {'bool': bool, 'int': int, 'float': float}
 
 
-class Variable(MutableList):
-    def __init__(self, all_rows=False):
+class Variable(Mutable):
+    """Column of a DataFrame
+    
+    Entries are stored in a compact array when they are all bools, all 
+    ints, or all floats (or None). Integer arrays are widened (from 8 up to 
+    64 bits) as needed. Columns which mix these types, or which have any 
+    other entries (e.g. strings), are stored as lists of objects, so that 
+    every entry keeps its type (e.g. an int in a column of floats is still 
+    exported as 1, not 1.0).
+    
+    _dtype is one of DTYPES or 'object'. _values is an array (or a list for 
+    object columns). _mask is a bytearray which is 1 where the entry is None, 
+    or None if no entries are None. Object columns store None directly.
+    """
+    _untracked_attr_names = Mutable._untracked_attr_names + [
+        '_dtype', '_values', '_mask'
+        ]
+    
+    @classmethod
+    def get_dtype(cls, entry):
+        """Return the dtype of a single entry"""
+        if entry is None:
+            return None
+        if isinstance(entry, (bool, np.bool_)):
+            return 'bool'
+        if isinstance(entry, (int, np.integer)):
+            min_val, max_val = INT_TYPECODES['q']
+            return 'int' if min_val <= entry <= max_val else 'object'
+        if isinstance(entry, float):
+            return 'float'
+        return 'object'
+    
+    @classmethod
+    def join_dtypes(cls, dtype0, dtype1):
+        """Return the dtype which can store entries of both dtypes"""
+        if dtype0 is None or dtype0 == dtype1:
+            return dtype1
+        if dtype1 is None:
+            return dtype0
+        return 'object'
+    
+    def __init__(self, source=[], all_rows=False):
         """
         all_rows indicates that all rows belonging to this variable should be the same.
         """
         self._python_type = None
         self.all_rows = all_rows
+        self._clear()
+        self.extend(source)
+        
+    def __setstate__(self, state):
+        """Set state for unpickling
         
+        Variables pickled as lists have their entries appended before their 
+        state is set.
+        """
+        entries = list(self) if '_values' in self.__dict__ else []
+        super().__setstate__(state)
+        if '_values' not in state:
+            self._clear()
+            self.extend(entries)
+            
+    def _clear(self):
+        self._dtype, self._values, self._mask = None, array('B'), None
+    
+    """List interface"""
+    def __len__(self):
+        return len(self._values)
+    
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            var = Variable(all_rows=self.all_rows)
+            var._dtype, var._values = self._dtype, self._values[key]
+            var._mask = None if self._mask is None else self._mask[key]
+            return var
+        if self._dtype == 'object':
+            return self._values[key]
+        if self._mask is not None and self._mask[key]:
+            return None
+        return PY_TYPES[self._dtype](self._values[key])
+    
+    def __delitem__(self, key):
+        self._changed()
+        del self._values[key]
+        if self._mask is not None:
+            del self._mask[key]
+    
+    def __iter__(self):
+        return (self[i] for i in range(len(self)))
+    
+    def __repr__(self):
+        return repr(list(self))
+    
+    def __iadd__(self, entries):
+        self.extend(entries)
+        return self
+    
+    def append(self, entry):
+        """Append a single entry"""
+        self._changed()
+        dtype = self.get_dtype(entry)
+        self._promote(dtype)
+        if self._dtype == 'object':
+            self._values.append(entry)
+        elif dtype is None:
+            self._null_mask().append(1)
+            self._values.append(0)
+        else:
+            entry = PY_TYPES[self._dtype](entry)
+            if self._dtype == 'int':
+                self._widen(entry, entry)
+            if self._mask is not None:
+                self._mask.append(0)
+            self._values.append(entry)
+    
+    def extend(self, entries):
+        """Extend with a list or Variable of entries
+        
+        Compact Variables are concatenated without converting their entries 
+        to Python objects.
+        """
+        if '_values' not in self.__dict__:
+            # entries of a Variable pickled as a list are being unpickled
+            self._clear()
+        if not (isinstance(entries, Variable) and entries._dtype != 'object'):
+            [self.append(entry) for entry in entries]
+            return
+        self._changed()
+        self._promote(entries._dtype)
+        if self._dtype == 'object':
+            self._values.extend(entries)
+            return
+        values = entries._values
+        if self._dtype == 'int' and entries._dtype == 'int' and values:
+            self._widen(*INT_TYPECODES[values.typecode])
+        if values.typecode != self._values.typecode:
+            values = array(self._values.typecode, values)
+        if entries._mask is not None or self._mask is not None:
+            mask = entries._mask
+            self._null_mask().extend(bytes(len(values)) if mask is None else mask)
+        self._values.extend(values)
+    
+    def _null_mask(self):
+        """Return the null mask, creating it if necessary"""
+        if self._mask is None:
+            self._mask = bytearray(len(self._values))
+        return self._mask
+    
+    def _widen(self, min_val, max_val):
+        """Widen an integer array so it can store values in the given range"""
+        for typecode, (tc_min, tc_max) in INT_TYPECODES.items():
+            if tc_min <= min_val and max_val <= tc_max:
+                break
+        if array(typecode).itemsize > self._values.itemsize:
+            self._values = array(typecode, self._values)
+            
+    def _promote(self, dtype):
+        """Promote the Variable so that it can store entries of dtype"""
+        new_dtype = self.join_dtypes(self._dtype, dtype)
+        if new_dtype == self._dtype:
+            return
+        if new_dtype == 'object':
+            values = list(self)
+            self._values, self._mask = values, None
+        elif TYPECODES[new_dtype] != self._values.typecode:
+            self._values = array(TYPECODES[new_dtype], self._values)
+        self._dtype = new_dtype
+    
+    """DataFrame methods"""
     def add(self, entry):
         """Add an entry (or list of entries) to the variable"""
-        if isinstance(entry, list):
-            self += entry
+        if isinstance(entry, (list, Variable)):
+            self.extend(entry)
         else:
             self.append(entry)
     
@@ -24,11 +216,60 @@ class Variable(MutableList):
         
         Add padding so that the Variable length is equal to rows.
         """
-        val = self[-1] if self and self.all_rows else None
-        self += [val]*(rows-len(self))
+        n = rows - len(self)
+        if n <= 0:
+            return
+        if self and self.all_rows:
+            self.extend([self[-1]]*n)
+        elif self._dtype == 'object':
+            self._changed()
+            self._values.extend([None]*n)
+        else:
+            self._changed()
+            self._null_mask().extend(b'\x01'*n)
+            self._values.extend(array(self._values.typecode, bytes(
+                n*self._values.itemsize)))
+    
+    def keep(self, ranges):
+        """Keep only the entries in the given (start, end) ranges"""
+        self._changed()
+        values, mask = self._values[:0], None
+        if self._mask is not None:
+            mask = bytearray()
+        for start, end in ranges:
+            values += self._values[start:end]
+            if mask is not None:
+                mask += self._mask[start:end]
+        self._values, self._mask = values, mask
+    
+    def to_pandas(self):
+        """Convert to a pandas array
+        
+        Compact Variables are converted without copying. The returned array 
+        shares memory with the Variable, which cannot change size while the 
+        array exists.
+        """
+        if self._dtype in (None, 'object'):
+            return np.array(list(self), dtype=object)
+        dtype = np.bool_ if self._dtype == 'bool' else self._values.typecode
+        values = np.frombuffer(self._values, dtype=dtype)
+        if self._mask is None:
+            return values
+        mask = np.frombuffer(self._mask, dtype=np.bool_)
+        if self._dtype == 'bool':
+            return pd.arrays.BooleanArray(values, mask)
+        if self._dtype == 'int':
+            return pd.arrays.IntegerArray(values, mask)
+        return pd.arrays.FloatingArray(values, mask)
 
 
 class DataFrame(MutableDict):
+    _untracked_attr_names = MutableDict._untracked_attr_names + [
+        '_nrows', '_row_index', '_tombstones', '_n_tombstoned'
+        ]
+    # Items are set before state when unpickling
+    _nrows = 0
+    
     @classmethod
     def coerce(cls, key, value):
         if isinstance(value, cls):
@@ -36,22 +277,80 @@ class DataFrame(MutableDict):
         if isinstance(value, dict):
             return cls(value)
         return super().coerce(key, value)
+    
+    def __init__(self, source={}, root=None):
+        """
+        _nrows is the number of rows (including tombstoned rows). 
+        _row_index maps ids to their (start, end) row ranges. _tombstones is 
+        a list of (start, end) ranges of replaced rows.
+        """
+        super().__init__(source, root)
+        self._nrows = 0
+        self._row_index = {}
+        self._tombstones = []
+        self._n_tombstoned = 0
+        self._count_rows()
+        
+    def __setstate__(self, state):
+        """Set state for unpickling
+        
+        DataFrames pickled before rows were tracked incrementally are 
+        indexed by their ID variable.
+        """
+        super().__setstate__(state)
+        if '_row_index' not in self.__dict__:
+            self._row_index = {}
+            self._tombstones = []
+            self._n_tombstoned = 0
+            self._count_rows()
+            self._index_rows('ID')
+        
+    def __setitem__(self, key, value):
+        super().__setitem__(key, value)
+        self._nrows = max(self._nrows, len(value))
+        
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._count_rows()
+        
+    def _count_rows(self):
+        self._nrows = max([len(v) for v in dict.values(self)] + [0])
+        
+    def _index_rows(self, var):
+        """Index rows by contiguous runs of values of the given variable"""
+        values = self.get(var, [])
+        start = 0
+        for end in range(1, len(values)+1):
+            if end == len(values) or values[end] != values[start]:
+                self._row_index[values[start]] = (start, end)
+                start = end
 
     def rows(self, variables=None):
         """Number of rows
         
         Return the maximum number of rows associated with a given subset of
-        variables. If variables is not given, set variables to all variables
-        in the DataFrame.
+        variables. If variables is not given, return the number of rows in 
+        the DataFrame. Tombstoned rows are included in the count.
         """
-        variables = variables or self.keys()
+        if variables is None:
+            return self._nrows
         lengths = [len(self[var]) for var in variables if var in self]
         return max(lengths) if lengths else 0
         
-    def append(self, data, all_rows=False):
+    def append(self, data, all_rows=False, id=None):
+        """Append data dictionary to the DataFrame
+        
+        If id is given, the appended rows are indexed by id. Rows previously 
+        indexed by the same id are tombstoned.
+        """
+        if id is not None:
+            self.remove_id(id)
         self.pad()
-        self.add(data, all_rows, rows=self.rows())
+        start = self.rows()
+        self.add(data, all_rows, rows=start)
         self.pad()
+        if id is not None:
+            self._row_index[id] = (start, self.rows())
     
     def add(self, data, all_rows=False, rows=None):
         """Add data dictionary to the DataFrame
@@ -63,6 +362,7 @@ class DataFrame(MutableDict):
         rows = rows or self.rows(data.keys())
         [self.prep_variable(var, all_rows, rows) for var in data.keys()]
         [self[var].add(entry) for var, entry in data.items()]
+        self._nrows = max([self._nrows]+[len(self[var]) for var in data])
         
     def prep_variable(self, var, all_rows=False, rows=None):
         """Prepare a variale for adding an entry
@@ -71,16 +371,110 @@ class DataFrame(MutableDict):
         """
         rows = self.rows() if rows is None else rows
         if var not in self:
-            self[var] = Variable(all_rows)
+            self[var] = Variable(all_rows=all_rows)
         self[var].pad(rows)
     
     def remove(self, start, end):
-        """Remove data between start and end indices"""
+        """Remove data between start and end indices
+        
+        Indices refer to the current rows, including tombstoned rows. The row 
+        index and tombstones are shifted accordingly.
+        """
         self._changed()
         for var in self.keys():
-            modified_data = self[var][:start] + self[var][end:]
-            self[var] = Variable(self[var].all_rows)
-            self[var].add(modified_data)
+            del self[var][start:end]
+        row_index = {}
+        for id, rows in self._row_index.items():
+            rows = self._shift_rows(rows, start, end)
+            if rows is not None:
+                row_index[id] = rows
+        self._row_index = row_index
+        tombstones = [
+            self._shift_rows(rows, start, end) for rows in self._tombstones]
+        self._tombstones = [rows for rows in tombstones if rows is not None]
+        self._n_tombstoned = sum([end-start for start, end in self._tombstones])
+        self._count_rows()
+        
+    def _shift_rows(self, rows, start, end):
+        """Shift a (start, end) row range after removing rows"""
+        removed = end - start
+        row_start, row_end = [
+            i if i <= start else max(i-removed, start) for i in rows]
+        return (row_start, row_end) if row_start < row_end else None
+    
+    def remove_id(self, id):
+        """Tombstone the rows indexed by the given id"""
+        rows = self._row_index.pop(id, None)
+        if rows is None:
+            return
+        self._changed()
+        self._tombstones.append(rows)
+        self._n_tombstoned += rows[1] - rows[0]
+        if self._n_tombstoned >= COMPACT_RATIO * self._nrows:
+            self.compact()
+            
+    def compact(self):
+        """Remove tombstoned rows
+        
+        All Variables are rebuilt in a single pass, and the row index is 
+        shifted accordingly.
+        """
+        if not self._tombstones:
+            return
+        self._changed()
+        dead = sorted(self._tombstones)
+        live, prev_end = [], 0
+        for start, end in dead + [(self._nrows, self._nrows)]:
+            if prev_end < start:
+                live.append((prev_end, start))
+            prev_end = end
+        [self[var].keep(live) for var in self.keys()]
+        dead_ends = [end for start, end in dead]
+        removed = list(accumulate([0]+[end-start for start, end in dead]))
+        shift = lambda i: i - removed[bisect_right(dead_ends, i)]
+        self._row_index = {
+            id: (shift(start), shift(end)) 
+            for id, (start, end) in self._row_index.items()
+            }
+        self._tombstones = []
+        self._n_tombstoned = 0
+        self._count_rows()
+    
+    def to_pandas(self):
+        """Convert to a pandas DataFrame
+        
+        Tombstoned rows are removed first. Compact Variables are converted 
+        without copying (see Variable.to_pandas).
+        """
+        self.compact()
+        return pd.DataFrame(
+            {var: self[var].to_pandas() for var in self.keys()}, copy=False)
+    
+    def iter_rows(self, variables=None, chunk_size=None, ids=None):
+        """Iterate over rows in chunks
+        
+        Tombstoned rows are removed first. Yield lists of at most chunk_size 
+        row tuples, with entries ordered by variables (all variables by 
+        default). Entries of variables not in the DataFrame are None.
+        
+        If ids are given, only the rows indexed by these ids are included, 
+        and each chunk contains the rows of a single id.
+        """
+        self.compact()
+        variables = list(self.keys()) if variables is None else variables
+        if ids is None:
+            ranges = [(0, self.rows())]
+        else:
+            ranges = [self._row_index[id] for id in ids if id in self._row_index]
+        for range_start, range_end in ranges:
+            size = chunk_size or range_end - range_start
+            for start in range(range_start, range_end, size):
+                end = min(start+size, range_end)
+                columns = [
+                    self[var][start:end] if var in self else [] 
+                    for var in variables
+                    ]
+                yield list(zip_longest(*columns))
     
     def pad(self):
         """Pad DataFrame so all Variables have the same number of rows"""
@@ -93,4 +487,4 @@ class DataFrameType(PickleType):
     pass
 
 
-DataFrame.associate_with(DataFrameType)
\ No newline at end of file
+DataFrame.associate_with(DataFrameType)
@@ -1,10 +1,29 @@
 """Function type
 
 Tracks a function and its arguments (and keyword arguments).
+
+Functions are stored by reference instead of being pickled with their rows. 
+A function without arguments is stored as its qualified name 
+('module:qualname'), and a function with arguments as a pickled 
+(name, args, kwargs) tuple. Names are resolved to callables once per process 
+(see resolve_function). Functions which cannot be resolved by name (e.g. 
+functools.partial objects) are pickled whole, as were all Functions in 
+earlier versions; such rows still load.
+
+A FunctionType column may inherit an application setting (e.g. 
+'page_compile'). A Function equal to the setting is stored as NULL, which 
+loads as the setting's current value. An empty Function is then stored as an 
+empty name, so that it is not confused with inheriting.
 """
 
-from sqlalchemy.types import PickleType
-from sqlalchemy_mutable import Mutable
+from flask import current_app, has_app_context
+from importlib import import_module
+from sqlalchemy.types import LargeBinary, TypeDecorator
+from sqlalchemy_mutable import Mutable, MutableDict, MutableList
+import pickle
+
+# Callables by qualified name
+_registry = {}
 
 
 class Function(Mutable):
@@ -20,6 +39,23 @@ class Function(Mutable):
         
     def __new__(cls, *args, **kwargs):
         return super().__new__(cls)
+
+    @classmethod
+    def _load(cls, func, args=[], kwargs={}):
+        """Construct a Function loaded from the database
+        
+        The attributes are set directly rather than through 
+        Mutable.__setattr__, which converts and tracks every assignment. This 
+        is several times faster than the constructor.
+        """
+        function = cls.__new__(cls)
+        function._tracked_attr_names.update(['_func', '_args', '_kwargs'])
+        object.__setattr__(function, '_func', func)
+        args = MutableList(list(args), function)
+        kwargs = MutableDict(dict(kwargs), function)
+        object.__setattr__(function, '_args', args)
+        object.__setattr__(function, '_kwargs', kwargs)
+        return function
         
     def __init__(self, func=None, args=[], kwargs={}):
         self.func = func
@@ -67,7 +103,87 @@ class Function(Mutable):
         return self.func(object, *self.args, **self.kwargs)
 
 
-class FunctionType(PickleType):
-    pass
-    
+def function_name(func):
+    """Return the qualified name by which a function is resolved, or None"""
+    module = getattr(func, '__module__', None)
+    qualname = getattr(func, '__qualname__', None)
+    if module is None or qualname is None or '<' in qualname:
+        return None
+    name = module+':'+qualname
+    try:
+        resolved = resolve_function(name)
+    except (ImportError, AttributeError):
+        return None
+    return name if resolved is func else None
+
+def resolve_function(name):
+    """Return the callable with the qualified name, cached in-process"""
+    func = _registry.get(name)
+    if func is None:
+        module, qualname = name.split(':')
+        func = import_module(module)
+        for attr in qualname.split('.'):
+            func = getattr(func, attr)
+        _registry[name] = func
+    return func
+
+
+class FunctionType(TypeDecorator):
+    impl = LargeBinary
+
+    def __init__(self, setting=None, *args, **kwargs):
+        self.setting = setting
+        super().__init__(*args, **kwargs)
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if self.setting is not None and self._equals_setting(value):
+            return None
+        if value.func is None:
+            return None if self.setting is None else b''
+        name = function_name(value.func)
+        if name is None:
+            return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        if not value.args and not value.kwargs:
+            return name.encode()
+        return pickle.dumps(
+            (name, value.args, value.kwargs), pickle.HIGHEST_PROTOCOL)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return self._inherit()
+        value = bytes(value)
+        if not value:
+            return Function._load(None)
+        if not value.startswith(pickle.PROTO):
+            return Function._load(resolve_function(value.decode()))
+        value = pickle.loads(value)
+        if isinstance(value, Function):
+            return value
+        name, args, kwargs = value
+        return Function._load(resolve_function(name), args, kwargs)
+
+    def _setting(self):
+        """Return the setting as a Function"""
+        setting = getattr(current_app, self.setting)
+        if isinstance(setting, Function):
+            return Function._load(setting.func, setting.args, setting.kwargs)
+        return Function._load(setting)
+
+    def _equals_setting(self, value):
+        """Indicate that the Function is equal to the setting"""
+        setting = self._setting()
+        return (
+            value.func is setting.func and value.args == setting.args
+            and value.kwargs == setting.kwargs
+            )
+
+    def _inherit(self):
+        """Return the Function loaded from NULL"""
+        if self.setting is None or not has_app_context():
+            return Function._load(None)
+        return self._setting()
+
+
 Function.associate_with(FunctionType)
\ No newline at end of file
@@ -1,7 +1,31 @@
-"""Hemlock native question polymorphs"""
+"""Hemlock native question polymorphs
+
+By default, each polymorph is mapped to its own table, joined to the 
+question table by id (joined table inheritance). If the SINGLE_TABLE_QUESTIONS 
+environment variable is set to 1 or true before hemlock is imported, the 
+polymorphs are instead mapped to the question table itself (single table 
+inheritance). Loading a list of mixed Questions then takes a single query 
+without joins. Embedded's _branch_id column moves to the question table.
+
+To migrate an existing database to single table inheritance, run the 
+following before starting the app with SINGLE_TABLE_QUESTIONS set:
+
+    ALTER TABLE question ADD COLUMN _branch_id INTEGER REFERENCES branch (id);
+    UPDATE question SET _branch_id = (
+        SELECT embedded._branch_id FROM embedded 
+        WHERE embedded.id = question.id
+        )
+        WHERE type = 'embedded';
+
+The free, single_choice, multi_choice, text, and embedded tables are then 
+unused, and may be dropped. The polymorphic identities stored in 
+question.type are unchanged. Custom polymorphs keep their own mapping; to 
+map them to the question table, omit their id column when SINGLE_TABLE is 
+set, as the native polymorphs do.
+"""
 
 from hemlock.question_polymorphs.embedded import Embedded
 from hemlock.question_polymorphs.free import Free
 from hemlock.question_polymorphs.multi_choice import MultiChoice
 from hemlock.question_polymorphs.single_choice import SingleChoice
-from hemlock.question_polymorphs.text import Text
\ No newline at end of file
+from hemlock.question_polymorphs.text import Text
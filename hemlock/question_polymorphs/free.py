@@ -4,7 +4,9 @@ from hemlock.question_polymorphs.imports import *
 
 
 class Free(Question):
-    id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    if not SINGLE_TABLE:
+        id = db.Column(
+            db.Integer, db.ForeignKey('question.id'), primary_key=True)
     __mapper_args__ = {'polymorphic_identity': 'free'}
     
     def compile_html(self):
@@ -1,4 +1,13 @@
-"""Question polymorph imports"""
+"""Question polymorph imports
+
+SINGLE_TABLE indicates that the native polymorphs are mapped to the question 
+table (see hemlock.question_polymorphs).
+"""
 
 from hemlock.app.factory import db
-from hemlock.database.models import Question
\ No newline at end of file
+from hemlock.database.models import Question
+
+import os
+
+SINGLE_TABLE = (
+    os.environ.get('SINGLE_TABLE_QUESTIONS', '').lower() in ['1', 'true'])
@@ -7,7 +7,9 @@ INPUT_TYPE = 'checkbox'
 
 
 class MultiChoice(Question):
-    id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    if not SINGLE_TABLE:
+        id = db.Column(
+            db.Integer, db.ForeignKey('question.id'), primary_key=True)
     __mapper_args__ = {'polymorphic_identity': 'multichoice'}
     
     def __init__(self, *args, **kwargs):
@@ -18,7 +20,7 @@ class MultiChoice(Question):
             self.choice_input_type = INPUT_TYPE
     
     def compile_html(self):
-        content = ''.join([choice.compile_html() for choice in self.choices])
+        content = ''.join([choice.get_html() for choice in self.choices])
         return super().compile_html(content=content)
     
     def record_response(self, choice_model_ids):
@@ -43,5 +45,6 @@ class MultiChoice(Question):
         if self.data is None:
             packed_data = {var+c.value: None 
                 for c in self.choices if c.value is not None}
-        packed_data = {var+key: self.data[key] for key in self.data.keys()}
+        else:
+            packed_data = {var+key: self.data[key] for key in self.data.keys()}
         return super().pack_data(packed_data)
\ No newline at end of file
@@ -9,7 +9,9 @@ INPUT_TYPE = 'radio'
 
 
 class SingleChoice(Question):
-    id = db.Column(db.Integer, db.ForeignKey('question.id'), primary_key=True)
+    if not SINGLE_TABLE:
+        id = db.Column(
+            db.Integer, db.ForeignKey('question.id'), primary_key=True)
     __mapper_args__ = {'polymorphic_identity': 'singlechoice'}
     
     def __init__(self, *args, **kwargs):
@@ -20,7 +22,7 @@ class SingleChoice(Question):
             self.choice_input_type = INPUT_TYPE
     
     def compile_html(self):
-        content = ''.join([choice.compile_html() for choice in self.choices])
+        content = ''.join([choice.get_html() for choice in self.choices])
         return super().compile_html(content=content)
     
     def record_response(self, choice_model_id):
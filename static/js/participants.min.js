@@ -1,15 +1,25 @@
 $(document).ready(function(){
     console.log("Socket URL is "+$SOCKET_URL)
     var socket = io.connect($SOCKET_URL+'/participants-nsp');
+    function update_status(curr_status){
+        $("#completed").text(curr_status.completed);
+        $("#in_progress").text(curr_status.in_progress);
+        $("#timed_out").text(curr_status.timed_out);
+        $("#total").text(curr_status.total);
+    }
     socket.on("connect", function(){
         console.log("Socket connected");
+        $.getJSON("/participants-status", update_status);
     });
     socket.on("json", function(e){
         console.log("Received status update "+e);
-        var curr_status = JSON.parse(e);
-        $("#completed").text(curr_status.completed);
-        $("#in_progress").text(curr_status.in_progress);
-        $("#timed_out").text(curr_status.timed_out);
-        $("#total").text(curr_status.total);
+        update_status(JSON.parse(e));
+    });
+    socket.on("download_progress", function(e){
+        var progress = JSON.parse(e);
+        var total = progress.total === null ? "" : " / "+progress.total;
+        $("#"+progress.table+"-progress").text(
+            progress.written+total+" rows"
+        );
     });
 }); 
\ No newline at end of file
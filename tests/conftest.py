@@ -0,0 +1,35 @@
+"""Test configuration
+
+Tests share one application with an in-memory SQLite database. Survey tests
+set the start branch builder with the start fixture.
+"""
+
+import os
+
+os.environ['DATABASE_URL'] = 'sqlite://'
+
+from hemlock import create_app
+
+import pytest
+
+# Current start branch builder
+builders = {}
+
+
+def start(origin=None):
+    return builders['start'](origin)
+
+@pytest.fixture(scope='session')
+def app():
+    return create_app({'duplicate_keys': None, 'start': start})
+
+@pytest.fixture
+def survey(app):
+    """Return a function which sets the start branch builder and returns a 
+    test client whose participant is on the first page"""
+    def make_survey(builder):
+        builders['start'] = builder
+        client = app.test_client()
+        client.get('/')
+        return client
+    return make_survey
@@ -0,0 +1,68 @@
+"""DataFrame tests"""
+
+from hemlock.database.types import DataFrame
+from hemlock.database.types.data_frame import Variable
+
+from io import StringIO
+import csv
+import pytest
+
+# Columns mixing bools, ints, floats, None, and other entries
+COLUMNS = [
+    [True, 1.5, None, 2.0],
+    [1, 2.5, 3, None],
+    [True, 2, False, -1],
+    [1.0, 2.0, None, .1],
+    [-200, 5, 70000, None],
+    [1, 2**70, 3],
+    [None, None, True, False],
+    ['a', 1, 1.0, True],
+    ]
+
+
+def make_data_frame(ids):
+    df = DataFrame()
+    [df.append({'ID': id, 'x': id*10}, id=id) for id in ids]
+    return df
+
+def test_remove_after_tombstone():
+    df = make_data_frame([1, 2, 3, 4, 5])
+    df.remove_id(2)
+    start, end = df._row_index[4]
+    df.remove(start, end)
+    assert sorted(df._row_index) == [1, 3, 5]
+    df.compact()
+    assert list(df['ID']) == [1, 3, 5]
+    assert list(df['x']) == [10, 30, 50]
+    assert [df._row_index[id] for id in [1, 3, 5]] == [(0, 1), (1, 2), (2, 3)]
+
+def test_remove_overlapping_tombstone():
+    df = make_data_frame([1, 2, 3, 4])
+    df.remove_id(3)
+    df.remove(1, 3)
+    assert df._tombstones == [] and df._n_tombstoned == 0
+    assert list(df['ID']) == [1, 4]
+    assert df._row_index == {1: (0, 1), 4: (1, 2)}
+
+def to_csv(rows):
+    buffer = StringIO()
+    csv.writer(buffer).writerows(rows)
+    return buffer.getvalue()
+
+@pytest.mark.parametrize('column', COLUMNS)
+def test_variable_keeps_entries(column):
+    var = Variable(column)
+    assert [(type(e), e) for e in var] == [(type(e), e) for e in column]
+
+@pytest.mark.parametrize('column', COLUMNS)
+def test_variable_concatenation_keeps_entries(column):
+    var = Variable(column[:2])
+    var.extend(Variable(column[2:]))
+    assert [(type(e), e) for e in var] == [(type(e), e) for e in column]
+
+@pytest.mark.parametrize('column', COLUMNS)
+def test_csv_matches_list_storage(column):
+    df = DataFrame()
+    [df.append({'ID': i, 'x': entry}, id=i) for i, entry in enumerate(column)]
+    expected = to_csv(zip(range(len(column)), column))
+    assert to_csv(row for rows in df.iter_rows() for row in rows) == expected
@@ -0,0 +1,47 @@
+"""Data store export tests"""
+
+from hemlock.app import db
+from hemlock.database.private import DataStore, StoreSequence
+from hemlock.database.types import DataFrame
+
+from io import StringIO
+import pandas as pd
+import pytest
+
+
+@pytest.fixture(params=['participant', 'dataframe'])
+def ds(app, request):
+    storage = app.data_storage
+    app.data_storage = request.param
+    with app.app_context():
+        db.create_all()
+        StoreSequence.init_counter()
+        ds = DataStore.query.first() or DataStore()
+        yield ds
+        db.session.rollback()
+    app.data_storage = storage
+
+def store(ds, part_id, x):
+    data = DataFrame()
+    data.append({'ID': part_id, 'x': x})
+    ds.store_data(part_id, data)
+
+def read_csv(ds, since=None):
+    return pd.read_csv(StringIO(''.join(ds.iter_csv('data', since=since))))
+
+def test_delta_contains_stored_participants(ds):
+    store(ds, 1, 10)
+    since = ds.store_seq
+    store(ds, 2, 20)
+    delta = read_csv(ds, since)
+    assert list(delta['ID']) == [2]
+    assert list(delta['x']) == [20]
+
+def test_empty_delta(ds):
+    store(ds, 1, 10)
+    previous = read_csv(ds)
+    delta = read_csv(ds, ds.store_seq)
+    assert delta.empty
+    assert 'ID' in delta.columns
+    merged = DataStore.merge_delta(previous, delta)
+    assert list(merged['ID']) == list(previous['ID'])
@@ -0,0 +1,43 @@
+"""Html minifier tests"""
+
+from hemlock import Branch, Free, Page, Validator
+from hemlock.app.html_minifier import minify_html
+
+
+def test_collapses_text_and_tag_whitespace():
+    html = '<div  class="a">\n    text   here\n</div>\n<br  \n/>'
+    assert minify_html(html) == '<div class="a"> text here </div> <br />'
+
+def test_keeps_quoted_attribute_values():
+    html = '<input  value="a    b" name=\'x   y\'>\n  <input value="">'
+    assert minify_html(html) == '<input value="a    b" name=\'x   y\'> <input value="">'
+
+def test_attribute_values_may_contain_gt():
+    html = '<input value="a >  b">   <span>  c  </span>'
+    assert minify_html(html) == '<input value="a >  b"> <span> c </span>'
+
+def test_keeps_verbatim_elements_and_comments():
+    html = (
+        '<textarea name="t">a\n\n  b</textarea> <pre>x   y</pre>'
+        '<script>var a  =  "b";</script><!--  note  -->'
+        )
+    assert minify_html(html) == html
+
+def reject(q):
+    return 'rejected'
+
+def reject_free(origin=None):
+    b = Branch()
+    q = Free(Page(b), var='free', text='Enter text')
+    Validator(q, validate=reject)
+    Page(b, terminal=True)
+    return b
+
+def test_free_response_whitespace_survives_rerender(survey):
+    client = survey(reject_free)
+    html = client.get('/survey').data.decode()
+    name = html.split('<input type="text"')[1].split('name="')[1].split('"')[0]
+    client.post('/survey', data={'direction': 'forward', name: 'a    b'})
+    html = client.get('/survey').data.decode()
+    assert 'rejected' in html
+    assert 'value="a    b"' in html
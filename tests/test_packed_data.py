@@ -0,0 +1,40 @@
+"""Question packed data cache tests"""
+
+from hemlock import Branch, Free, Page, Participant
+from hemlock.app import db
+
+
+def free_survey(origin=None):
+    b = Branch()
+    Free(Page(b), var='free', text='Enter text')
+    Page(b, terminal=True)
+    return b
+
+def complete(client):
+    html = client.get('/survey').data.decode()
+    name = html.split('<input type="text"')[1].split('name="')[1].split('"')[0]
+    client.post('/survey', data={'direction': 'forward', name: 'hello'})
+
+def stored_question():
+    db.session.expunge_all()
+    part = Participant.query.order_by(Participant.id.desc()).first()
+    return [q for q in part.questions if q.var == 'free'][0]
+
+def test_packed_data_are_stored_with_question(app, survey):
+    complete(survey(free_survey))
+    with app.app_context():
+        q = stored_question()
+        assert q._packed_data is not None
+        assert q._packed_data == q.pack_data()
+        assert q.get_packed_data()['free'] == 'hello'
+
+def test_changed_data_invalidate_stored_packed_data(app, survey):
+    complete(survey(free_survey))
+    with app.app_context():
+        q = stored_question()
+        q.data = 'changed'
+        assert q._packed_data is None
+        assert q.get_packed_data()['free'] == 'changed'
+        db.session.flush()
+        assert q._packed_data['free'] == 'changed'
+        db.session.rollback()
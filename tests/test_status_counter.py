@@ -0,0 +1,50 @@
+"""Status counter tests"""
+
+from hemlock.app import db
+from hemlock.database.private import DataStore, StatusCounter
+from hemlock.database.private.data_store import STATUS
+
+from sqlalchemy import event
+import pytest
+
+
+@pytest.fixture
+def counters(app):
+    with app.app_context():
+        db.create_all()
+        StatusCounter.init_shards(STATUS, app.status_counter_shards)
+        db.session.commit()
+        yield
+        db.session.rollback()
+
+def locked_rows(transition):
+    """Return the (status, shard) counter rows updated by a transition"""
+    rows = []
+    def record(conn, cursor, statement, params, context, executemany):
+        if statement.startswith('UPDATE status_counter'):
+            rows.append((params[1], params[2]))
+    event.listen(db.engine, 'before_cursor_execute', record)
+    try:
+        DataStore.update_status(*transition)
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', record)
+    return rows
+
+@pytest.mark.parametrize('transition', [
+    ('in_progress', 'completed'), ('completed', 'in_progress'),
+    ('timed_out', 'completed'), ('completed', 'timed_out')
+    ])
+def test_transition_updates_rows_in_order(counters, transition):
+    for i in range(20):
+        rows = locked_rows(transition)
+        assert [status for status, shard in rows] == sorted(transition)
+        assert rows == sorted(rows)
+
+def test_transition_counts(counters):
+    before = StatusCounter.counts()
+    DataStore.update_status(None, 'in_progress')
+    DataStore.update_status('in_progress', 'completed')
+    DataStore.update_status('completed', 'completed')
+    after = StatusCounter.counts()
+    assert after['in_progress'] == before['in_progress']
+    assert after['completed'] == before['completed'] + 1